@@ -0,0 +1,100 @@
+"""Shared cache of chatbot answers.
+
+The chatbot prompt is a fixed feature description plus the user's message,
+so the same question always gets an equivalent answer. Answers are cached
+under the normalized message and the model name in the ``chatbot`` cache
+alias. That alias is a Django cache backend, so a file, database or Redis
+backend shares it between worker processes.
+
+Eviction is whatever the backend does: the default file-based cache drops
+a random third of its entries (``CULL_FREQUENCY``) once ``MAX_ENTRIES`` is
+reached, Redis and Memcached evict by their own policy. The hit and miss
+counters are therefore kept in each process rather than in the cache,
+where they could be culled, and where ``incr`` is not atomic across the
+processes sharing a file-based cache.
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import caches
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(message):
+    """Fold case, punctuation and whitespace: "How do I make a resume?" == "how do i make a resume"."""
+    message = unicodedata.normalize('NFKC', message).casefold()
+    message = _PUNCTUATION.sub(' ', message)
+    return _WHITESPACE.sub(' ', message).strip()
+
+
+def _key(message, model):
+    digest = hashlib.sha256(f'{model}\0{normalize(message)}'.encode()).hexdigest()
+    return f'response:{digest}'
+
+
+class ResponseCache:
+    """Bounded answer cache with this process's hit/miss counters.
+
+    Size and TTL come from the cache alias (``OPTIONS.MAX_ENTRIES`` and
+    ``TIMEOUT``). Every hit pushes the entry's expiry back, so entries that
+    keep being asked for outlive idle ones, which age out.
+    """
+
+    def __init__(self, alias='chatbot'):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, message, model):
+        key = _key(message, model)
+        response = self.cache.get(key)
+        self._count('hits' if response is not None else 'misses')
+        if response is not None:
+            self.cache.touch(key)
+        return response
+
+    def set(self, message, model, response):
+        self.cache.set(_key(message, model), response)
+
+    async def aget(self, message, model):
+        key = _key(message, model)
+        response = await self.cache.aget(key)
+        self._count('hits' if response is not None else 'misses')
+        if response is not None:
+            await self.cache.atouch(key)
+        return response
+
+    async def aset(self, message, model, response):
+        await self.cache.aset(_key(message, model), response)
+
+    def stats(self):
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
+
+    def clear(self):
+        self.cache.clear()
+        with self.lock:
+            self.hits = self.misses = 0
+
+    def _count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+response_cache = ResponseCache()
+
+
+def cache_enabled():
+    return getattr(settings, 'CHATBOT_CACHE_ENABLED', True)
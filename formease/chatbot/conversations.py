@@ -0,0 +1,126 @@
+"""Per-user chat conversations.
+
+Ollama's ``/api/generate`` returns a ``context`` (the conversation so far
+as tokens). It is kept server-side in the ``chatbot`` cache, keyed by
+conversation, so a follow-up sends only the new message. If the context
+has expired or grown past ``CHATBOT_CONTEXT_MAX_TOKENS``, the next prompt is
+rebuilt from the last ``CHATBOT_HISTORY_MESSAGES`` stored ChatMessages.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import ChatMessage, Conversation
+
+SESSION_KEY = 'chat_conversation_id'
+
+
+def _context_key(conversation_id):
+    return f'context:{conversation_id}'
+
+
+def _is_expired(conversation):
+    return conversation.updated_at < timezone.now() - timedelta(seconds=settings.CHATBOT_CONVERSATION_TIMEOUT)
+
+
+class ChatTurn:
+    """One user message within a conversation and what is needed to answer it."""
+
+    def __init__(self, user, conversation, message, context=None, history=()):
+        self.user = user
+        self.conversation = conversation
+        self.message = message
+        self.context = context
+        self.history = list(history)
+        self.reply_context = None
+
+    @property
+    def is_first(self):
+        """No earlier turns: the answer depends on the message alone."""
+        return not self.context and not self.history
+
+    @property
+    def options(self):
+        return {'context': self.context} if self.context else {}
+
+    @classmethod
+    def start(cls, request, message, new_conversation=False):
+        conversation = None
+        conversation_id = request.session.get(SESSION_KEY)
+        if conversation_id and not new_conversation:
+            conversation = Conversation.objects.filter(id=conversation_id, user=request.user).first()
+        if conversation is None or _is_expired(conversation):
+            conversation = Conversation.objects.create(user=request.user)
+            request.session[SESSION_KEY] = conversation.id
+            return cls(request.user, conversation, message)
+
+        context = caches['chatbot'].get(_context_key(conversation.id))
+        history = []
+        if not context:
+            recent = conversation.messages.order_by('-timestamp')[:settings.CHATBOT_HISTORY_MESSAGES]
+            history = list(recent)[::-1]
+        return cls(request.user, conversation, message, context, history)
+
+    @classmethod
+    async def astart(cls, request, message, new_conversation=False):
+        user = await request.auser()
+        conversation = None
+        conversation_id = await request.session.aget(SESSION_KEY)
+        if conversation_id and not new_conversation:
+            conversation = await Conversation.objects.filter(id=conversation_id, user=user).afirst()
+        if conversation is None or _is_expired(conversation):
+            conversation = await Conversation.objects.acreate(user=user)
+            await request.session.aset(SESSION_KEY, conversation.id)
+            return cls(user, conversation, message)
+
+        context = await caches['chatbot'].aget(_context_key(conversation.id))
+        history = []
+        if not context:
+            recent = conversation.messages.order_by('-timestamp')[:settings.CHATBOT_HISTORY_MESSAGES]
+            history = [chat async for chat in recent][::-1]
+        return cls(user, conversation, message, context, history)
+
+    def _context_to_keep(self):
+        # A turn answered without the model (intent fast path, error) leaves
+        # the previous context in place. A context past the cap would make
+        # every later turn slower; drop it and let the next turn fall back
+        # to the bounded history.
+        context = self.reply_context or self.context
+        if context and len(context) <= settings.CHATBOT_CONTEXT_MAX_TOKENS:
+            return context
+        return None
+
+    def record(self, response):
+        """Save the exchange and keep Ollama's context for the next turn."""
+        chat = ChatMessage.objects.create(
+            user=self.user,
+            conversation=self.conversation,
+            message=self.message,
+            response=response
+        )
+        Conversation.objects.filter(pk=self.conversation.pk).update(updated_at=timezone.now())
+        cache = caches['chatbot']
+        context = self._context_to_keep()
+        if context:
+            cache.set(_context_key(self.conversation.pk), context, settings.CHATBOT_CONTEXT_TTL)
+        else:
+            cache.delete(_context_key(self.conversation.pk))
+        return chat
+
+    async def arecord(self, response):
+        chat = await ChatMessage.objects.acreate(
+            user=self.user,
+            conversation=self.conversation,
+            message=self.message,
+            response=response
+        )
+        await Conversation.objects.filter(pk=self.conversation.pk).aupdate(updated_at=timezone.now())
+        cache = caches['chatbot']
+        context = self._context_to_keep()
+        if context:
+            await cache.aset(_context_key(self.conversation.pk), context, settings.CHATBOT_CONTEXT_TTL)
+        else:
+            await cache.adelete(_context_key(self.conversation.pk))
+        return chat
@@ -0,0 +1,196 @@
+"""Rule-based fast path in front of the chatbot LLM.
+
+Most chatbot traffic is navigation ("open the resume builder", "where are
+my summaries?") and small talk, which has one right answer. ``route()``
+answers those from fixed rules in microseconds and returns ``None`` for
+everything else, so only real questions reach the model.
+
+A message is only answered here when the match is unambiguous: every word
+must be part of an intent phrase or a filler word (typos are corrected
+with difflib), phrases must appear whole and in order, and exactly one
+intent may be asked for. A message that says anything else, such as "how
+does the summarizer handle tables" or "is my resume good", goes to the LLM.
+"""
+import difflib
+import functools
+import logging
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+
+from .cache import normalize
+
+logger = logging.getLogger(__name__)
+
+FEATURES = {
+    "resume": {
+        "title": "Resume Builder",
+        "url": "/resume-builder/",
+        "description": "Create professional resumes with AI assistance"
+    },
+    "pdf": {
+        "title": "PDF Summarizer",
+        "url": "/pdf-summary/",
+        "description": "Generate AI-powered summaries of PDF documents"
+    },
+    "resumes": {
+        "title": "My Resumes",
+        "url": "/resumes/",
+        "description": "View all your created resumes"
+    },
+    "summaries": {
+        "title": "PDF Summaries",
+        "url": "/pdf-summaries/",
+        "description": "View all your PDF summaries"
+    }
+}
+
+
+def _feature_answer(key):
+    feature = FEATURES[key]
+    return f"{feature['description']} in the {feature['title']}: {feature['url']}"
+
+
+def _features_overview():
+    lines = "\n".join(
+        f"- {feature['title']} ({feature['url']}): {feature['description']}" for feature in FEATURES.values()
+    )
+    return f"I can help you with:\n{lines}"
+
+
+Intent = namedtuple('Intent', ['name', 'phrases', 'answer'])
+
+# Phrases are matched whole and in order, with only filler words in between
+# ("make a resume"). The intent with the longest matching phrase wins, so
+# "my resumes" beats "resume".
+INTENTS = [
+    Intent('resume_builder', [
+        'resume', 'cv', 'resume builder', 'build resume', 'create resume', 'make resume',
+        'new resume', 'write resume', 'generate resume', 'create cv', 'make cv',
+    ], _feature_answer('resume')),
+    Intent('pdf_summary', [
+        'pdf', 'summarizer', 'pdf summarizer', 'summarize pdf', 'summarise pdf', 'summary pdf',
+        'upload pdf', 'summarize document', 'summarize file', 'pdf summary',
+    ], _feature_answer('pdf')),
+    Intent('resume_list', [
+        'resumes', 'my resume', 'my resumes', 'all resumes', 'saved resumes', 'old resumes',
+        'previous resumes', 'list resumes', 'created resumes', 'my cv', 'my cvs',
+    ], _feature_answer('resumes')),
+    Intent('summary_list', [
+        'summaries', 'my summaries', 'pdf summaries', 'all summaries', 'saved summaries',
+        'previous summaries', 'old summaries', 'list summaries', 'my pdf summaries',
+    ], _feature_answer('summaries')),
+    Intent('help', [
+        'help', 'features', 'what can you do', 'what do you do', 'what can i do',
+        'what is formease', 'what is this',
+    ], _features_overview()),
+    Intent('greeting', [
+        'hi', 'hello', 'hey', 'good morning', 'good afternoon', 'good evening',
+    ], "Hello! I'm the FormEase assistant. " + _features_overview()),
+    Intent('thanks', [
+        'thanks', 'thank you', 'thx', 'cheers',
+    ], "You're welcome! Let me know if there's anything else I can help with."),
+]
+
+# Words that carry no meaning of their own in a navigation request
+FILLER_WORDS = {
+    'a', 'an', 'the', 'i', 'me', 'my', 'to', 'for', 'of', 'please', 'pls', 'can', 'could', 'would',
+    'you', 'want', 'wanna', 'like', 'need', 'how', 'do', 'where', 'is', 'are', 'find', 'open',
+    'go', 'take', 'show', 'see', 'view', 'get', 'page', 'link', 'start', 'navigate', 'let', 'lets',
+    'there', 'again', 'now', 'just', 'some', 'one', 'it', 'this', 'that', 'with', 'in', 'on',
+    'ok', 'okay', 'so', 'much', 'very', 'tool', 'section', 'which',
+}
+
+_PHRASES = [(intent, tuple(phrase.split())) for intent in INTENTS for phrase in intent.phrases]
+# Words that may stand on their own. Words of longer phrases ("good" in
+# "good morning", "what" in "what can you do") only count inside their phrase.
+VOCABULARY = frozenset(FILLER_WORDS.union(phrase[0] for _, phrase in _PHRASES if len(phrase) == 1))
+# Typos are corrected towards any word the router knows
+_SORTED_WORDS = sorted(FILLER_WORDS.union(*(phrase for _, phrase in _PHRASES)))
+
+
+@functools.lru_cache(maxsize=4096)
+def _correct(word):
+    # Only longer words are corrected: short ones are too easily confused
+    if len(word) < 4 or word in _SORTED_WORDS:
+        return word
+    matches = difflib.get_close_matches(word, _SORTED_WORDS, n=1, cutoff=0.8)
+    return matches[0] if matches else word
+
+
+def _find(phrase, words):
+    """Positions of every occurrence of ``phrase`` in ``words``, filler allowed in between."""
+    for start, word in enumerate(words):
+        if word != phrase[0]:
+            continue
+        positions, needed = [start], 1
+        for position in range(start + 1, len(words)):
+            if needed == len(phrase):
+                break
+            if words[position] == phrase[needed]:
+                positions.append(position)
+                needed += 1
+            elif words[position] not in FILLER_WORDS:
+                break
+        if needed == len(phrase):
+            yield frozenset(positions)
+
+
+def match(message):
+    """The intent ``message`` unambiguously asks for, or ``None``."""
+    words = [_correct(word) for word in normalize(message).split()]
+    if not words or len(words) > settings.CHATBOT_INTENT_MAX_WORDS:
+        return None
+
+    found = [(intent, positions) for intent, phrase in _PHRASES for positions in _find(phrase, words)]
+    covered = frozenset().union(*(positions for _, positions in found))
+    if any(word not in VOCABULARY and position not in covered for position, word in enumerate(words)):
+        return None
+    if not found:
+        return None
+
+    best, best_positions = max(found, key=lambda item: len(item[1]))
+    # Any other intent asked for outside the best phrase makes the message ambiguous
+    for intent, positions in found:
+        if intent is not best and not positions <= best_positions:
+            return None
+    return best
+
+
+class RouterStats:
+    """Counts fast-path hits and logs the hit rate every ``log_every`` messages."""
+
+    def __init__(self, log_every=100):
+        self.log_every = log_every
+        self.hits = 0
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def record(self, hit):
+        with self.lock:
+            self.total += 1
+            self.hits += hit
+            hits, total = self.hits, self.total
+        if total % self.log_every == 0:
+            logger.info('Chatbot intent fast path: %d/%d messages (%.1f%%) answered without the LLM',
+                        hits, total, 100 * hits / total)
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.total if self.total else 0.0
+
+
+stats = RouterStats()
+
+
+def route(message):
+    """The fixed answer for ``message`` if it has one, else ``None``."""
+    if not settings.CHATBOT_INTENTS_ENABLED:
+        return None
+    intent = match(message)
+    stats.record(intent is not None)
+    if intent is None:
+        return None
+    logger.debug('Chatbot intent %s matched %r', intent.name, message)
+    return intent.answer
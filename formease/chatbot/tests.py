@@ -1,3 +1,188 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.llm import AsyncLLMClient, LLMClient
+from core.tests import QueryBudgetTestCase
+
+from . import intents
+from .cache import ResponseCache
+from .models import ChatMessage, Conversation
+
+
+class ChatQueryTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(
+            AsyncLLMClient, 'generate', mock.AsyncMock(return_value={'response': 'An answer', 'context': [1, 2, 3]})
+        )
+        self.generate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def send(self, message, **extra):
+        return self.client.post(
+            reverse('chatbot:chat_message'), json.dumps({'message': message, **extra}), content_type='application/json'
+        )
+
+    def test_first_message(self):
+        # user; new conversation; session (conversation id); message; conversation updated_at.
+        # The session write runs in a savepoint here, as the test itself is a transaction.
+        with self.assertNumQueries(7):
+            response = self.send('Explain the difference between TCP and UDP', new_conversation=True)
+        self.assertEqual(response.json()['response'], 'An answer')
+        self.generate.assert_called_once()
+
+    def test_follow_up_message(self):
+        self.send('Explain the difference between TCP and UDP', new_conversation=True)
+        # user; conversation; message; conversation updated_at. The history is
+        # not read, as Ollama's context for the conversation is cached.
+        with self.assertNumQueries(4):
+            response = self.send('And which one does DNS use?')
+        self.assertEqual(response.json()['response'], 'An answer')
+        self.assertEqual(ChatMessage.objects.filter(user=self.user).count(), 2)
+
+    def test_context_is_reused_for_a_follow_up(self):
+        self.send('Explain the difference between TCP and UDP', new_conversation=True)
+        self.send('And which one does DNS use?')
+        prompt = self.generate.call_args.args[0]
+        self.assertEqual(prompt, 'And which one does DNS use?')
+        self.assertEqual(self.generate.call_args.kwargs['context'], [1, 2, 3])
+
+    def test_expired_conversation_starts_over(self):
+        first = self.send('Explain the difference between TCP and UDP', new_conversation=True).json()
+        idle = timedelta(seconds=settings.CHATBOT_CONVERSATION_TIMEOUT + 1)
+        Conversation.objects.update(updated_at=timezone.now() - idle)
+        second = self.send('And which one does DNS use?').json()
+        self.assertNotEqual(second['conversation'], first['conversation'])
+        self.assertNotIn('context', self.generate.call_args.kwargs)
+        self.assertNotIn('Conversation so far', self.generate.call_args.args[0])
+
+    @override_settings(CHATBOT_CONTEXT_MAX_TOKENS=2)
+    def test_oversized_context_falls_back_to_recent_history(self):
+        first = self.send('Explain the difference between TCP and UDP', new_conversation=True).json()
+        self.assertIsNone(caches['chatbot'].get(f'context:{first["conversation"]}'))
+        second = self.send('And which one does DNS use?').json()
+        self.assertEqual(second['conversation'], first['conversation'])
+        self.assertNotIn('context', self.generate.call_args.kwargs)
+        prompt = self.generate.call_args.args[0]
+        self.assertIn('User: Explain the difference between TCP and UDP\nAssistant: An answer', prompt)
+        self.assertIn('Response to: And which one does DNS use?', prompt)
+
+    @override_settings(CHATBOT_HISTORY_MESSAGES=2, CHATBOT_CONTEXT_MAX_TOKENS=2)
+    def test_replayed_history_is_bounded(self):
+        for n in range(4):
+            self.send(f'Question number {n} about networking', new_conversation=n == 0)
+        prompt = self.generate.call_args.args[0]
+        self.assertNotIn('Question number 0', prompt)
+        self.assertIn('User: Question number 1', prompt)
+        self.assertIn('User: Question number 2', prompt)
+
+
+class ChatStreamTests(QueryBudgetTestCase):
+    chunks = [
+        {'response': 'TCP is '}, {'response': 'reliable.'}, {'response': '', 'done': True, 'context': [1, 2, 3]},
+    ]
+
+    def events(self, body):
+        # (event, data) pairs from a text/event-stream body
+        return [
+            (block.split('\n')[0].removeprefix('event: '), json.loads(block.split('\n')[1].removeprefix('data: ')))
+            for block in body.strip().split('\n\n')
+        ]
+
+    def check_stream(self, body):
+        events = self.events(body)
+        self.assertEqual(events[:2], [('token', {'token': 'TCP is '}), ('token', {'token': 'reliable.'})])
+        self.assertEqual(events[2][0], 'done')
+        chat = ChatMessage.objects.get(user=self.user)
+        self.assertEqual(chat.response, 'TCP is reliable.')
+        self.assertEqual(events[2][1]['conversation'], chat.conversation_id)
+        self.assertEqual(caches['chatbot'].get(f'context:{chat.conversation_id}'), [1, 2, 3])
+
+    def test_tokens_are_forwarded_and_the_reply_saved_at_the_end(self):
+        with mock.patch.object(LLMClient, 'stream_generate', return_value=iter(self.chunks)):
+            response = self.client.post(
+                reverse('chatbot:chat_message_stream'), json.dumps({'message': 'Explain TCP and UDP'}),
+                content_type='application/json'
+            )
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            # Nothing is saved until the stream has been consumed
+            self.assertFalse(ChatMessage.objects.exists())
+            body = b''.join(response.streaming_content).decode()
+        self.check_stream(body)
+
+    async def test_asgi_stream_is_fed_asynchronously(self):
+        async def stream_generate(*args, **kwargs):
+            for chunk in self.chunks:
+                yield chunk
+
+        await self.async_client.aforce_login(self.user)
+        with mock.patch.object(AsyncLLMClient, 'stream_generate', side_effect=stream_generate):
+            response = await self.async_client.post(
+                reverse('chatbot:chat_message_stream'), json.dumps({'message': 'Explain TCP and UDP'}),
+                content_type='application/json'
+            )
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        await sync_to_async(self.check_stream)(body)
+
+    def test_invalid_requests(self):
+        url = reverse('chatbot:chat_message_stream')
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url, 'not json', content_type='application/json').status_code, 400)
+        self.assertEqual(
+            self.client.post(url, json.dumps({'message': ' '}), content_type='application/json').status_code, 400
+        )
+
+
+@override_settings(CACHES={'chatbot': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-chatbot-stats',
+    'OPTIONS': {'MAX_ENTRIES': 2, 'CULL_FREQUENCY': 1},
+}})
+class ResponseCacheTests(SimpleTestCase):
+    def test_counters_survive_culling(self):
+        cache = ResponseCache()
+        self.addCleanup(cache.clear)
+        cache.set('What is FormEase?', 'model', 'A form helper')
+        self.assertEqual(cache.get('what is formease', 'model'), 'A form helper')
+        # A full cache is emptied (CULL_FREQUENCY 1) on the next write
+        for n in range(3):
+            cache.set(f'Question {n}', 'model', 'Answer')
+        self.assertIsNone(cache.get('What is FormEase?', 'model'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+
+class IntentRouterTests(SimpleTestCase):
+    def assertRoutes(self, messages, name):
+        for message in messages:
+            with self.subTest(message=message):
+                intent = intents.match(message)
+                self.assertEqual(intent and intent.name, name)
+
+    def test_navigation_requests(self):
+        self.assertRoutes(['open the resume builder', 'how do i make a resume', 'resme bulder'], 'resume_builder')
+        self.assertRoutes(['where are my summaries', 'my pdf summaries'], 'summary_list')
+        self.assertRoutes(['show me my resumes', 'i want to see my cv'], 'resume_list')
+        self.assertRoutes(['what can you do', 'can you help me'], 'help')
+        self.assertRoutes(['hello', 'good morning'], 'greeting')
+
+    def test_questions_go_to_the_model(self):
+        self.assertRoutes([
+            'is my resume good',
+            'can you help me with my resume',
+            'what do you do with my resume',
+            'what is a resume',
+            'good',
+            'how does the summarizer handle tables',
+        ], None)
+
+    @override_settings(CHATBOT_INTENTS_ENABLED=False)
+    def test_disabled(self):
+        self.assertIsNone(intents.route('hello'))
@@ -5,4 +5,5 @@ app_name = 'chatbot'
 
 urlpatterns = [
     path('message/', views.chat_message, name='chat_message'),
+    path('message/stream/', views.chat_message_stream, name='chat_message_stream'),
 ]
\ No newline at end of file
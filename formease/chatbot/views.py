@@ -1,62 +1,157 @@
-import requests
+from django.conf import settings
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from .models import ChatMessage
+from core.llm import get_async_client, get_client
+from core.streaming import event_stream, sse
+from .cache import cache_enabled, response_cache
+from .conversations import ChatTurn
+from .intents import FEATURES, route
 import json
 
-def get_ollama_response(message):
-    try:
-        # Define available features and their descriptions
-        features = {
-            "resume": {
-                "url": "/resume-builder/",
-                "description": "Create professional resumes with AI assistance"
-            },
-            "pdf": {
-                "url": "/pdf-summary/",
-                "description": "Generate AI-powered summaries of PDF documents"
-            },
-            "resumes": {
-                "url": "/resumes/",
-                "description": "View all your created resumes"
-            },
-            "summaries": {
-                "url": "/pdf-summaries/",
-                "description": "View all your PDF summaries"
-            }
-        }
-
-        # Add feature information to the prompt
-        feature_context = """
+ERROR_RESPONSE = "I apologize, but I'm having trouble processing your request at the moment."
+
+def build_prompt(message, history=()):
+    # Add feature information to the prompt
+    feature_lines = "".join(
+        f"        - {feature['title']} ({feature['url']}): {feature['description']}\n"
+        for feature in FEATURES.values()
+    )
+    feature_context = f"""
         Available features:
-        - Resume Builder (/resume-builder/): Create professional resumes with AI assistance
-        - PDF Summarizer (/pdf-summary/): Generate AI-powered summaries of PDF documents
-        - My Resumes (/resumes/): View all your created resumes
-        - PDF Summaries (/pdf-summaries/): View all your PDF summaries
-        """
-
-        response = requests.post('http://localhost:11434/api/generate',
-            json={
-                'model': 'llama3',
-                'prompt': f"""You are FormEase assistant. Here are the available features:
+{feature_lines}        """
+
+    # Earlier turns, when they have to be replayed as text
+    transcript = "".join(
+        f"User: {chat.message}\nAssistant: {chat.response}\n" for chat in history
+    )
+    if transcript:
+        transcript = f"""Conversation so far:
+                {transcript}
+                """
+
+    return f"""You are FormEase assistant. Here are the available features:
                 {feature_context}
                 
                 When referring to features, include their paths.
-                Response to: {message}""",
-                'stream': False
-            })
-        if response.status_code == 200:
-            return response.json()['response']
-        return "I apologize, but I'm having trouble processing your request at the moment."
+                {transcript}Response to: {message}"""
+
+def turn_prompt(turn):
+    # With a context from Ollama the earlier turns (and the instructions
+    # above) are already in the model's tokens; only the new message is sent.
+    if turn.context:
+        return turn.message
+    return build_prompt(turn.message, turn.history)
+
+def get_ollama_response(turn):
+    result = get_client().generate(turn_prompt(turn), settings.CHATBOT_MODEL, task='chat', **turn.options)
+    turn.reply_context = result.get('context')
+    return result['response']
+
+def stream_ollama_response(turn):
+    """Yield the reply to ``turn`` piece by piece as Ollama generates it."""
+    for chunk in get_client().stream_generate(turn_prompt(turn), settings.CHATBOT_MODEL, task='chat', **turn.options):
+        if chunk.get('response'):
+            yield chunk['response']
+        if chunk.get('done'):
+            turn.reply_context = chunk.get('context')
+
+async def aget_ollama_response(turn):
+    result = await get_async_client().generate(turn_prompt(turn), settings.CHATBOT_MODEL, task='chat', **turn.options)
+    turn.reply_context = result.get('context')
+    return result['response']
+
+async def astream_ollama_response(turn):
+    async for chunk in get_async_client().stream_generate(turn_prompt(turn), settings.CHATBOT_MODEL, task='chat', **turn.options):
+        if chunk.get('response'):
+            yield chunk['response']
+        if chunk.get('done'):
+            turn.reply_context = chunk.get('context')
+
+# The get/stream chatbot helpers answer navigation and small talk from the
+# intent rules, then repeated opening questions from the shared response
+# cache, and only cache complete, successful answers. Later turns depend on
+# the conversation, so they always go to the model.
+
+def _use_cache(turn):
+    return turn.is_first and cache_enabled()
+
+def get_chatbot_response(turn):
+    answer = route(turn.message)
+    if answer is not None:
+        return answer
+    if _use_cache(turn):
+        cached = response_cache.get(turn.message, settings.CHATBOT_MODEL)
+        if cached is not None:
+            return cached
+    try:
+        response = get_ollama_response(turn)
     except Exception as e:
-        return f"I apologize, but I'm having trouble processing your request at the moment. Error: {str(e)}"
+        return f"{ERROR_RESPONSE} Error: {str(e)}"
+    if _use_cache(turn):
+        response_cache.set(turn.message, settings.CHATBOT_MODEL, response)
+    return response
 
-def get_chatbot_response(message):
-    return get_ollama_response(message)
+async def aget_chatbot_response(turn):
+    answer = route(turn.message)
+    if answer is not None:
+        return answer
+    if _use_cache(turn):
+        cached = await response_cache.aget(turn.message, settings.CHATBOT_MODEL)
+        if cached is not None:
+            return cached
+    try:
+        response = await aget_ollama_response(turn)
+    except Exception as e:
+        return f"{ERROR_RESPONSE} Error: {str(e)}"
+    if _use_cache(turn):
+        await response_cache.aset(turn.message, settings.CHATBOT_MODEL, response)
+    return response
+
+def stream_chatbot_response(turn):
+    answer = route(turn.message)
+    if answer is not None:
+        yield answer
+        return
+    if _use_cache(turn):
+        cached = response_cache.get(turn.message, settings.CHATBOT_MODEL)
+        if cached is not None:
+            yield cached
+            return
+    pieces = []
+    try:
+        for piece in stream_ollama_response(turn):
+            pieces.append(piece)
+            yield piece
+    except Exception as e:
+        yield f"{ERROR_RESPONSE} Error: {str(e)}"
+        return
+    if _use_cache(turn):
+        response_cache.set(turn.message, settings.CHATBOT_MODEL, "".join(pieces))
+
+async def astream_chatbot_response(turn):
+    answer = route(turn.message)
+    if answer is not None:
+        yield answer
+        return
+    if _use_cache(turn):
+        cached = await response_cache.aget(turn.message, settings.CHATBOT_MODEL)
+        if cached is not None:
+            yield cached
+            return
+    pieces = []
+    try:
+        async for piece in astream_ollama_response(turn):
+            pieces.append(piece)
+            yield piece
+    except Exception as e:
+        yield f"{ERROR_RESPONSE} Error: {str(e)}"
+        return
+    if _use_cache(turn):
+        await response_cache.aset(turn.message, settings.CHATBOT_MODEL, "".join(pieces))
 
 @login_required
-def chat_message(request):
+async def chat_message(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
@@ -65,21 +160,64 @@ def chat_message(request):
             if not user_message:
                 return JsonResponse({'error': 'Message is required'}, status=400)
             
-            response = get_chatbot_response(user_message)
+            turn = await ChatTurn.astart(request, user_message, data.get('new_conversation', False))
+            response = await aget_chatbot_response(turn)
             
             # Save the chat message and response
-            chat = ChatMessage.objects.create(
-                user=request.user,
-                message=user_message,
-                response=response
-            )
+            chat = await turn.arecord(response)
             
             return JsonResponse({
                 'response': response,
+                'conversation': turn.conversation.id,
                 'timestamp': chat.timestamp.strftime('%Y-%m-%d %H:%M:%S')
             })
             
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
             
-    return JsonResponse({'error': 'Only POST requests are allowed'}, status=405)
\ No newline at end of file
+    return JsonResponse({'error': 'Only POST requests are allowed'}, status=405)
+
+def _chat_events(turn):
+    pieces = []
+    for piece in stream_chatbot_response(turn):
+        pieces.append(piece)
+        yield sse('token', {'token': piece})
+
+    # Save the chat message once the whole response is known
+    chat = turn.record("".join(pieces))
+    yield sse('done', {
+        'conversation': turn.conversation.id,
+        'timestamp': chat.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+async def _achat_events(turn):
+    pieces = []
+    async for piece in astream_chatbot_response(turn):
+        pieces.append(piece)
+        yield sse('token', {'token': piece})
+
+    chat = await turn.arecord("".join(pieces))
+    yield sse('done', {
+        'conversation': turn.conversation.id,
+        'timestamp': chat.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+@login_required
+def chat_message_stream(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST requests are allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+    user_message = data.get('message', '').strip()
+    if not user_message:
+        return JsonResponse({'error': 'Message is required'}, status=400)
+
+    # Resolve the conversation now, while the session can still be saved
+    # with this response
+    turn = ChatTurn.start(request, user_message, data.get('new_conversation', False))
+
+    return event_stream(request, _chat_events(turn), _achat_events(turn))
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        # Off by default so management commands and tests never touch the
+        # LLM backend; web processes turn it on with LLM_WARM_UP_ON_STARTUP=1.
+        if settings.LLM_WARM_UP_ON_STARTUP:
+            from .warmup import start_keep_alive
+            start_keep_alive()
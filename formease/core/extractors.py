@@ -0,0 +1,228 @@
+"""Text extraction for uploaded documents, one extractor per format.
+
+Extractors are registered by file extension and MIME type and turn a
+document (a filesystem path or its bytes) into ``Section``s, in document
+order: the pages of a PDF, runs of paragraphs of a Word document, the
+slides of a PowerPoint deck. They are generators, but not lazy about
+memory: the PDF extractor reads every page's text layer up front to plan
+its OCR, and python-docx and python-pptx parse the whole file on open.
+
+To support another format, subclass ``Extractor`` and decorate it with
+``@register``.
+"""
+import io
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
+
+import docx
+import fitz  # PyMuPDF
+import pptx
+from django.conf import settings
+from docx.table import Table
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+from . import ocr
+
+logger = logging.getLogger(__name__)
+
+# ``number`` is the page, slide or section number, counting from 1;
+# ``method`` is how the text was obtained ('text' or 'ocr').
+Section = namedtuple('Section', ['number', 'text', 'method'])
+
+_BY_EXTENSION = {}
+_BY_MIME_TYPE = {}
+
+
+class Extractor:
+    label = ''
+    extensions = ()
+    mime_types = ()
+
+    def sections(self, source, **options):
+        """Yield the ``Section``s of ``source``, in document order."""
+        raise NotImplementedError
+
+
+def register(extractor_class):
+    extractor = extractor_class()
+    for extension in extractor.extensions:
+        _BY_EXTENSION[extension] = extractor
+    for mime_type in extractor.mime_types:
+        _BY_MIME_TYPE[mime_type] = extractor
+    return extractor_class
+
+
+def for_file(name, content_type=None):
+    """The extractor for a file called ``name``, or ``None`` if the format isn't supported.
+
+    The extension decides; the MIME type is only used for names without one.
+    """
+    extension = os.path.splitext(name)[1].lower()
+    if extension:
+        return _BY_EXTENSION.get(extension)
+    return _BY_MIME_TYPE.get((content_type or '').split(';')[0].strip())
+
+
+def extensions():
+    """Every supported extension, e.g. for an ``accept`` attribute."""
+    return sorted(_BY_EXTENSION)
+
+
+def _as_file(source):
+    # python-docx and python-pptx take a path or a file object
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+
+# PDF
+
+def open_document(source):
+    """Open a PDF given either a filesystem path or its raw bytes."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype='pdf')
+    return fitz.open(source)
+
+
+def _ocr_range(source, numbers):
+    # Runs inside a pool process: every worker opens its own handle on the
+    # document, since PyMuPDF documents can't be shared between processes.
+    doc = open_document(source)
+    try:
+        texts = ocr.ocr_pages([doc[number] for number in numbers])
+        return [Section(number + 1, text, 'ocr') for number, text in zip(numbers, texts)]
+    except Exception:
+        logger.warning('OCR failed for pages %s-%s, using their text layer.',
+                       numbers[0] + 1, numbers[-1] + 1, exc_info=True)
+        return []
+    finally:
+        doc.close()
+
+
+def extraction_workers():
+    return getattr(settings, 'PDF_EXTRACTION_WORKERS', None) or os.cpu_count() or 1
+
+
+@register
+class PDFExtractor(Extractor):
+    """Pages of a PDF, OCRing the ones without a usable text layer.
+
+    The text layer of every page is read in-process before the first page
+    is yielded (``ocr.classify``); that is fast, and for digital documents
+    it is all there is to do. Pages without usable text
+    are OCRed in batches fanned out over a process pool so scanned
+    documents use every core, and each page is yielded as soon as the batch
+    holding it is done. A handful of OCR pages, or ``workers=1``, are
+    handled in-process to skip the pool start-up cost.
+    """
+    label = 'PDF'
+    extensions = ('.pdf',)
+    mime_types = ('application/pdf',)
+
+    def sections(self, source, workers=None):
+        doc = open_document(source)
+        try:
+            profile = ocr.classify(doc)
+        finally:
+            doc.close()
+
+        numbers = [] if profile.kind == ocr.DIGITAL or ocr.backend() is None else profile.ocr_pages
+        min_pages = getattr(settings, 'PDF_EXTRACTION_MIN_PAGES_PER_WORKER', 2)
+        workers = min(workers or extraction_workers(), len(numbers) // min_pages)
+        if workers <= 1:
+            batches = [numbers] if numbers else []
+        else:
+            # A few batches per worker keeps the pool busy when pages differ in
+            # cost, without reopening the document for every page.
+            batch_count = min(len(numbers), workers * 4)
+            bounds = [len(numbers) * i // batch_count for i in range(batch_count + 1)]
+            batches = [numbers[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+        ocr_numbers = set(numbers)
+        with ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as pool:
+            results = (pool.map if pool else map)(_ocr_range, repeat(source), batches)
+            pending = zip(batches, results)
+            done = {}
+            for number, text in enumerate(profile.texts):
+                # Batches come back in page order, so the next one holds this page
+                while number in ocr_numbers and number not in done:
+                    batch, pages = next(pending)
+                    # A failed batch falls back to the text layer of its pages
+                    done.update(dict.fromkeys(batch))
+                    done.update((page.number - 1, page) for page in pages)
+                yield done.pop(number, None) or Section(number + 1, text, 'text')
+
+
+# Word
+
+@register
+class DocxExtractor(Extractor):
+    """Paragraphs and tables of a Word document, in document order.
+
+    Word files have no fixed pages, so consecutive blocks are grouped into
+    sections of about ``SECTION_CHARS`` characters.
+    """
+    label = 'Word'
+    extensions = ('.docx',)
+    mime_types = ('application/vnd.openxmlformats-officedocument.wordprocessingml.document',)
+
+    SECTION_CHARS = 3000
+
+    def blocks(self, document):
+        for block in document.iter_inner_content():
+            if isinstance(block, Table):
+                for row in block.rows:
+                    cells = [cell.text.strip() for cell in row.cells]
+                    if any(cells):
+                        yield ' | '.join(cells)
+            elif block.text.strip():
+                yield block.text
+
+    def sections(self, source, **options):
+        document = docx.Document(_as_file(source))
+        number, lines, size = 1, [], 0
+        for block in self.blocks(document):
+            lines.append(block)
+            size += len(block)
+            if size >= self.SECTION_CHARS:
+                yield Section(number, '\n'.join(lines) + '\n', 'text')
+                number, lines, size = number + 1, [], 0
+        if lines:
+            yield Section(number, '\n'.join(lines) + '\n', 'text')
+
+
+# PowerPoint
+
+@register
+class PptxExtractor(Extractor):
+    """One section per slide: its text boxes, tables and speaker notes."""
+    label = 'PowerPoint'
+    extensions = ('.pptx',)
+    mime_types = ('application/vnd.openxmlformats-officedocument.presentationml.presentation',)
+
+    def shape_texts(self, shapes):
+        for shape in shapes:
+            if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+                yield from self.shape_texts(shape.shapes)
+            elif shape.has_text_frame:
+                if shape.text_frame.text.strip():
+                    yield shape.text_frame.text
+            elif shape.has_table:
+                for row in shape.table.rows:
+                    cells = [cell.text.strip() for cell in row.cells]
+                    if any(cells):
+                        yield ' | '.join(cells)
+
+    def sections(self, source, **options):
+        presentation = pptx.Presentation(_as_file(source))
+        for number, slide in enumerate(presentation.slides, 1):
+            lines = list(self.shape_texts(slide.shapes))
+            if slide.has_notes_slide and slide.notes_slide.notes_text_frame is not None:
+                notes = slide.notes_slide.notes_text_frame.text.strip()
+                if notes:
+                    lines.append(f'Notes: {notes}')
+            yield Section(number, '\n'.join(lines) + '\n' if lines else '', 'text')
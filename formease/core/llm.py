@@ -0,0 +1,412 @@
+"""Shared HTTP clients for the Ollama server.
+
+Every view and the PDF worker talk to the LLM through ``get_client()`` (or
+``get_async_client()`` from async views) so they share one pool of
+keep-alive connections per process, the same per-task timeouts, bounded
+retries and a circuit breaker that makes calls fail immediately while the
+backend is down instead of tying up threads.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    """The LLM backend could not produce a response."""
+
+
+class LLMUnavailable(LLMError):
+    """The circuit breaker is open: the backend is considered down."""
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failed calls.
+
+    While open every call is rejected; after ``reset_timeout`` seconds one
+    trial call is let through (half-open) and its outcome decides whether
+    the circuit closes again or stays open for another period.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_running or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def release(self):
+        """End a trial call without judging the backend by it (the caller gave up)."""
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning('LLM circuit opened after %s consecutive failures', self.failures)
+                self.opened_at = time.monotonic()
+
+
+class BaseLLMClient:
+    def __init__(self, base_url, timeouts, max_retries, retry_backoff, pool_size, breaker, keep_alive=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeouts = timeouts
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.pool_size = pool_size
+        self.breaker = breaker
+        self.keep_alive = keep_alive
+
+    def timeout(self, task):
+        """``(connect, read)`` timeout in seconds for a kind of call."""
+        return self.timeouts.get(task, self.timeouts['default'])
+
+    def check_breaker(self):
+        if not self.breaker.allow():
+            raise LLMUnavailable('The language model is temporarily unavailable.')
+
+    def with_keep_alive(self, payload):
+        # Ollama resets a model's unload timer to the keep_alive of every
+        # request, so each call has to ask for the configured one or a single
+        # call without it would shorten the model's stay to the 5 minute default.
+        if self.keep_alive is None or 'model' not in payload or 'keep_alive' in payload:
+            return payload
+        return dict(payload, keep_alive=self.keep_alive)
+
+    @staticmethod
+    def read_json(response, *keys):
+        """The JSON body of ``response``, or the value under ``keys`` in it.
+
+        A reply that isn't JSON or lacks the expected fields raises
+        ``LLMError``, like any other backend failure.
+        """
+        try:
+            data = response.json()
+            for key in keys:
+                data = data[key]
+        except (ValueError, LookupError, TypeError) as e:
+            raise LLMError(f'Malformed reply from the LLM backend: {e!r}') from e
+        return data
+
+    @staticmethod
+    def parse_line(line):
+        # Ollama streams one JSON object per line
+        try:
+            chunk = json.loads(line)
+        except ValueError as e:
+            raise LLMError(f'Malformed reply from the LLM backend: {e!r}') from e
+        if 'error' in chunk:
+            raise LLMError(chunk['error'])
+        return chunk
+
+
+class LLMClient(BaseLLMClient):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, path, payload, task='default', stream=False):
+        """POST to the backend with retries, returning the ``requests`` response.
+
+        Connection errors, timeouts and 5xx answers are retried with
+        exponential backoff; only a call that fails every attempt counts
+        against the circuit breaker.
+        """
+        self.check_breaker()
+        payload = self.with_keep_alive(payload)
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = self.session.post(
+                        f'{self.base_url}{path}',
+                        json=payload,
+                        timeout=self.timeout(task),
+                        stream=stream
+                    )
+                    if response.status_code < 500:
+                        break
+                    response.close()
+                    error = LLMError(f'LLM backend returned HTTP {response.status_code}')
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = LLMError(f'LLM backend request failed: {e}')
+                except requests.RequestException as e:
+                    # Not worth retrying (bad URL, broken response), but still a failed call
+                    raise LLMError(f'LLM backend request failed: {e}') from e
+                if attempt < self.max_retries:
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+            else:
+                raise error
+        except BaseException:
+            # Every way out has to settle the breaker: a half-open trial
+            # left running would keep it from ever letting a call through
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success()
+        if response.status_code != 200:
+            response.close()
+            raise LLMError(f'LLM backend returned HTTP {response.status_code}: {response.text[:200]}')
+        return response
+
+    def _stream(self, path, payload, task):
+        with self.post(path, dict(payload, stream=True), task, stream=True) as response:
+            try:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = self.parse_line(line)
+                    yield chunk
+                    if chunk.get('done'):
+                        return
+            except requests.RequestException as e:
+                raise LLMError(f'LLM stream interrupted: {e}') from e
+
+    def chat(self, messages, model, task='default', **options):
+        """Return the assistant's reply to ``messages``."""
+        payload = dict(options, model=model, messages=messages, stream=False)
+        return self.read_json(self.post('/api/chat', payload, task), 'message', 'content')
+
+    def stream_chat(self, messages, model, task='default', **options):
+        """Yield the assistant's reply to ``messages`` piece by piece."""
+        payload = dict(options, model=model, messages=messages)
+        for chunk in self._stream('/api/chat', payload, task):
+            piece = chunk.get('message', {}).get('content')
+            if piece:
+                yield piece
+
+    def generate(self, prompt, model, task='default', **options):
+        """Return the full ``/api/generate`` response for ``prompt``."""
+        payload = dict(options, model=model, prompt=prompt, stream=False)
+        return self.read_json(self.post('/api/generate', payload, task))
+
+    def stream_generate(self, prompt, model, task='default', **options):
+        """Yield the ``/api/generate`` chunks for ``prompt`` as they arrive."""
+        payload = dict(options, model=model, prompt=prompt)
+        yield from self._stream('/api/generate', payload, task)
+
+    def embed(self, texts, model, task='embed'):
+        """Return one embedding vector per string in ``texts``, in order."""
+        payload = {'model': model, 'input': list(texts)}
+        return self.read_json(self.post('/api/embed', payload, task), 'embeddings')
+
+    def load(self, model, keep_alive=None, embedding=False):
+        """Load ``model`` into memory without generating anything.
+
+        Embedding models can't serve ``/api/generate``, so they are loaded
+        by embedding a single word instead.
+        """
+        if embedding:
+            path, payload = '/api/embed', {'model': model, 'input': 'warm-up'}
+        else:
+            path, payload = '/api/generate', {'model': model, 'stream': False}
+        if keep_alive is not None:
+            payload['keep_alive'] = keep_alive
+        self.post(path, payload, 'load')
+
+    def running_models(self):
+        """Names of the models the backend currently has in memory.
+
+        A single quick request that bypasses the retries and the breaker, so
+        health checks answer promptly and never open the circuit themselves.
+        """
+        try:
+            response = self.session.get(f'{self.base_url}/api/ps', timeout=self.timeout('health'))
+            response.raise_for_status()
+            models = response.json().get('models', [])
+        except (requests.RequestException, ValueError) as e:
+            raise LLMError(f'Could not list running models: {e}') from e
+        return {m.get('name') or m.get('model') for m in models}
+
+
+class AsyncLLMClient(BaseLLMClient):
+    """``LLMClient`` for async views, built on an ``httpx.AsyncClient``.
+
+    Awaiting the backend parks a coroutine instead of a thread, so one ASGI
+    worker can hold hundreds of LLM calls open at once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=self.pool_size)
+        )
+
+    def timeout(self, task):
+        connect, read = super().timeout(task)
+        return httpx.Timeout(read, connect=connect)
+
+    async def post(self, path, payload, task='default', stream=False):
+        """Async counterpart of ``LLMClient.post``; same retry and breaker rules."""
+        self.check_breaker()
+        payload = self.with_keep_alive(payload)
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    request = self.http.build_request(
+                        'POST', f'{self.base_url}{path}', json=payload, timeout=self.timeout(task)
+                    )
+                    response = await self.http.send(request, stream=stream)
+                    if response.status_code < 500:
+                        break
+                    await response.aclose()
+                    error = LLMError(f'LLM backend returned HTTP {response.status_code}')
+                except (httpx.TransportError, httpx.TimeoutException) as e:
+                    error = LLMError(f'LLM backend request failed: {e}')
+                except (httpx.HTTPError, httpx.InvalidURL) as e:
+                    raise LLMError(f'LLM backend request failed: {e}') from e
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+            else:
+                raise error
+        except asyncio.CancelledError:
+            # The request went away; that says nothing about the backend
+            self.breaker.release()
+            raise
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success()
+        if response.status_code != 200:
+            await response.aread()
+            await response.aclose()
+            raise LLMError(f'LLM backend returned HTTP {response.status_code}: {response.text[:200]}')
+        return response
+
+    async def _stream(self, path, payload, task):
+        response = await self.post(path, dict(payload, stream=True), task, stream=True)
+        try:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = self.parse_line(line)
+                yield chunk
+                if chunk.get('done'):
+                    return
+        except httpx.HTTPError as e:
+            raise LLMError(f'LLM stream interrupted: {e}') from e
+        finally:
+            await response.aclose()
+
+    async def chat(self, messages, model, task='default', **options):
+        payload = dict(options, model=model, messages=messages, stream=False)
+        return self.read_json(await self.post('/api/chat', payload, task), 'message', 'content')
+
+    async def stream_chat(self, messages, model, task='default', **options):
+        payload = dict(options, model=model, messages=messages)
+        async for chunk in self._stream('/api/chat', payload, task):
+            piece = chunk.get('message', {}).get('content')
+            if piece:
+                yield piece
+
+    async def generate(self, prompt, model, task='default', **options):
+        payload = dict(options, model=model, prompt=prompt, stream=False)
+        return self.read_json(await self.post('/api/generate', payload, task))
+
+    async def stream_generate(self, prompt, model, task='default', **options):
+        payload = dict(options, model=model, prompt=prompt)
+        async for chunk in self._stream('/api/generate', payload, task):
+            yield chunk
+
+    async def embed(self, texts, model, task='embed'):
+        payload = {'model': model, 'input': list(texts)}
+        return self.read_json(await self.post('/api/embed', payload, task), 'embeddings')
+
+
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+_client_lock = threading.Lock()
+_breaker = None
+
+
+def _client_options():
+    # One breaker per process, shared by the sync and async clients: when
+    # the backend is down it is down for both.
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker(settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_TIMEOUT)
+    return {
+        'base_url': settings.LLM_BASE_URL,
+        'timeouts': settings.LLM_TIMEOUTS,
+        'max_retries': settings.LLM_MAX_RETRIES,
+        'retry_backoff': settings.LLM_RETRY_BACKOFF,
+        'pool_size': settings.LLM_POOL_SIZE,
+        'breaker': _breaker,
+        'keep_alive': settings.LLM_KEEP_ALIVE,
+    }
+
+
+def get_client():
+    """The process-wide client, created from settings on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient(**_client_options())
+    return _client
+
+
+async def _close_with_loop(client):
+    # Parked until the loop shuts down: asyncio.run() and asgiref's
+    # async_to_sync cancel the tasks left over before closing their loop
+    try:
+        await asyncio.Future()
+    finally:
+        await client.http.aclose()
+
+
+def get_async_client():
+    """The async client for the running event loop.
+
+    httpx connections belong to the loop that opened them. Under ASGI there
+    is one loop per worker process; under WSGI every async view gets a
+    short-lived loop of its own, so clients are kept per loop and each one
+    is closed, with its connections, when its loop shuts down.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        with _client_lock:
+            client = _async_clients.get(loop)
+            if client is None:
+                client = _async_clients[loop] = AsyncLLMClient(**_client_options())
+                # The loop only keeps a weak reference to its tasks
+                client.closer = loop.create_task(_close_with_loop(client))
+    return client
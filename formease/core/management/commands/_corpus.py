@@ -0,0 +1,107 @@
+"""Synthetic documents for the benchmark commands.
+
+Generating the corpus on the fly keeps binary fixtures out of the repo and
+lets a run pick any page count.
+"""
+import io
+
+import docx
+import fitz  # PyMuPDF
+import pptx
+from pptx.util import Inches
+
+LOREM = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud "
+    "exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat. "
+)
+
+
+def _write_text_page(doc, number):
+    page = doc.new_page()
+    rect = fitz.Rect(72, 72, page.rect.width - 72, page.rect.height - 72)
+    page.insert_textbox(rect, f"Section {number + 1}\n\n" + LOREM * 12, fontsize=11)
+    return page
+
+
+def _write_scanned_page(doc, number):
+    # Render a text page to an image and place only the image on a fresh
+    # page, which is what a scanner produces.
+    source = fitz.open()
+    pix = _write_text_page(source, number).get_pixmap(dpi=150)
+    source.close()
+    page = doc.new_page()
+    page.insert_image(page.rect, pixmap=pix)
+    return page
+
+
+_PDF_DATE = 'D:20240101000000Z'
+
+
+def build_pdf(pages, kind='text'):
+    """Return the bytes of a ``pages``-page PDF.
+
+    ``kind`` is ``text`` (digital), ``scanned`` (image-only) or ``mixed``
+    (every third page scanned).
+    """
+    doc = fitz.open()
+    for number in range(pages):
+        scanned = kind == 'scanned' or (kind == 'mixed' and number % 3 == 2)
+        if scanned:
+            _write_scanned_page(doc, number)
+        else:
+            _write_text_page(doc, number)
+    # Fixed dates and no new file ID, so the same arguments give the same bytes
+    doc.set_metadata({'producer': 'FormEase benchmark corpus', 'creationDate': _PDF_DATE, 'modDate': _PDF_DATE})
+    data = doc.tobytes(garbage=3, deflate=True, no_new_id=True)
+    doc.close()
+    return data
+
+
+def corpus(pages, large_pages):
+    """The standard PDF benchmark set as ``(name, kind, pages)`` for ``build_pdf``.
+
+    Generation is deterministic, so runs made months apart measure the same
+    documents.
+    """
+    return [
+        ('digital', 'text', pages),
+        ('scanned', 'scanned', pages),
+        ('mixed', 'mixed', pages),
+        ('large', 'mixed', large_pages),
+    ]
+
+
+def build_docx(pages):
+    """Return the bytes of a Word document with about ``pages`` pages of text and a table every few pages."""
+    document = docx.Document()
+    for number in range(pages):
+        document.add_heading(f"Section {number + 1}", level=2)
+        for _ in range(4):
+            document.add_paragraph(LOREM * 3)
+        if number % 5 == 4:
+            table = document.add_table(rows=4, cols=3)
+            for row, cells in enumerate(table.rows):
+                for column, cell in enumerate(cells.cells):
+                    cell.text = f"Row {row + 1}, column {column + 1}"
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+def build_pptx(slides):
+    """Return the bytes of a ``slides``-slide deck with a title, bullets and notes per slide."""
+    presentation = pptx.Presentation()
+    layout = presentation.slide_layouts[1]  # title and content
+    for number in range(slides):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {number + 1}"
+        body = slide.placeholders[1].text_frame
+        body.text = LOREM
+        for _ in range(3):
+            body.add_paragraph().text = LOREM[:120]
+        slide.shapes.add_textbox(Inches(1), Inches(6.5), Inches(8), Inches(0.5)).text_frame.text = LOREM[:80]
+        slide.notes_slide.notes_text_frame.text = LOREM * 2
+    output = io.BytesIO()
+    presentation.save(output)
+    return output.getvalue()
@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+USAGE = """
+Compare how many concurrent LLM-bound requests one worker can hold under WSGI and ASGI:
+
+  1. Start a fake Ollama that answers every call after a fixed delay:
+       manage.py bench_concurrency --fake-llm 11435 --latency 5
+  2. Serve the app against it, first with WSGI, then with ASGI:
+       OLLAMA_HOST=http://127.0.0.1:11435 gunicorn formease.wsgi -w 1 --threads 8
+       OLLAMA_HOST=http://127.0.0.1:11435 uvicorn formease.asgi:application --workers 1
+  3. Load each one with the same settings and compare the reports:
+       manage.py bench_concurrency --url http://127.0.0.1:8000 --username USER --password PASS \\
+           --concurrency 200 --requests 400
+"""
+
+
+class Command(BaseCommand):
+    help = 'Load-test /chatbot/message/ with many concurrent requests, or serve a fake slow Ollama.'
+
+    def create_parser(self, *args, **kwargs):
+        parser = super().create_parser(*args, **kwargs)
+        parser.epilog = USAGE
+        parser.formatter_class = argparse.RawDescriptionHelpFormatter
+        return parser
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fake-llm', type=int, metavar='PORT',
+                            help='Serve a fake Ollama API on this port instead of generating load.')
+        parser.add_argument('--latency', type=float, default=5.0,
+                            help='Seconds the fake Ollama takes to answer each call.')
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the app under test.')
+        parser.add_argument('--username')
+        parser.add_argument('--password')
+        parser.add_argument('--concurrency', type=int, default=100, help='Requests kept in flight at once.')
+        parser.add_argument('--requests', type=int, default=200, help='Total requests to send.')
+        parser.add_argument('--timeout', type=float, default=300.0)
+
+    def handle(self, *args, **options):
+        if options['fake_llm']:
+            self.serve_fake_llm(options['fake_llm'], options['latency'])
+            return
+        if not options['username'] or not options['password']:
+            raise CommandError('--username and --password are required to load-test the chat endpoint.')
+        asyncio.run(self.load(options))
+
+    def serve_fake_llm(self, port, latency):
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                time.sleep(latency)
+                if self.path == '/api/chat':
+                    body = {'message': {'role': 'assistant', 'content': 'Benchmark reply'}, 'done': True}
+                else:
+                    body = {'response': 'Benchmark reply', 'done': True}
+                data = json.dumps(body).encode()
+                if payload.get('stream'):
+                    data += b'\n'
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        server.daemon_threads = True
+        self.stdout.write(f'Fake Ollama on http://127.0.0.1:{port}, {latency}s per call. Ctrl+C to stop.')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    async def load(self, options):
+        limits = httpx.Limits(max_connections=options['concurrency'])
+        async with httpx.AsyncClient(base_url=options['url'], limits=limits, timeout=options['timeout']) as client:
+            await client.get('/login/')
+            response = await client.post('/login/', data={
+                'username': options['username'],
+                'password': options['password'],
+                'csrfmiddlewaretoken': client.cookies.get('csrftoken', ''),
+            }, headers={'Referer': f"{options['url']}/login/"})
+            if 'sessionid' not in client.cookies:
+                raise CommandError(f'Login failed (HTTP {response.status_code}).')
+            headers = {'X-CSRFToken': client.cookies['csrftoken'], 'Referer': options['url']}
+
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            latencies = []
+            errors = 0
+
+            async def send(number):
+                nonlocal errors
+                async with semaphore:
+                    started = time.perf_counter()
+                    try:
+                        response = await client.post('/chatbot/message/', json={'message': f'Benchmark {number}'},
+                                                     headers=headers)
+                        response.raise_for_status()
+                        latencies.append(time.perf_counter() - started)
+                    except httpx.HTTPError:
+                        errors += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(send(number) for number in range(options['requests'])))
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(f'{len(latencies)} ok, {errors} failed in {elapsed:.1f}s '
+                          f'({len(latencies) / elapsed:.1f} req/s)')
+        if latencies:
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(f'latency p50 {statistics.median(latencies):.2f}s, p95 {p95:.2f}s, '
+                              f'max {latencies[-1]:.2f}s')
+            # Average number of requests the server was actually holding open
+            self.stdout.write(f'effective concurrency {sum(latencies) / elapsed:.1f}')
@@ -0,0 +1,117 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.utils import timezone
+
+from chatbot.models import ChatMessage, Conversation
+from core.models import PDFSummaryJob
+
+ALIAS = 'bench_db_writes'
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent writers against a scratch SQLite database, once with Django\'s default '
+            'SQLite options and once with the configured ones, and count "database is locked" errors.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=16, help='Threads writing at the same time.')
+        parser.add_argument('--writes', type=int, default=100, help='Writes per thread.')
+
+    def handle(self, *args, **options):
+        default = connections.databases['default']
+        if default['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('This benchmark is for SQLite; the default database is not SQLite.')
+
+        self.stdout.write(f'{options["writers"]} writers x {options["writes"]} writes each')
+        self.stdout.write(f'{"options":<12} {"ok":>6} {"locked":>7} {"writes/s":>9} '
+                          f'{"p50 ms":>8} {"p95 ms":>8} {"max ms":>8}')
+        for label, db_options in [('django', {}), ('configured', default.get('OPTIONS', {}))]:
+            with tempfile.TemporaryDirectory(prefix='formease-db-') as workdir:
+                self.prepare(dict(default, NAME=os.path.join(workdir, 'bench.sqlite3'), OPTIONS=db_options))
+                try:
+                    self.report(label, self.run(options['writers'], options['writes']))
+                finally:
+                    connections[ALIAS].close()
+                    del connections[ALIAS]
+                    del connections.databases[ALIAS]
+
+    def prepare(self, database):
+        connections.databases[ALIAS] = database
+        call_command('migrate', database=ALIAS, verbosity=0)
+        users = User.objects.db_manager(ALIAS).bulk_create(
+            User(username=f'bench-db-{n}') for n in range(64)
+        )
+        for user in users:
+            Conversation.objects.using(ALIAS).create(user=user)
+            PDFSummaryJob.objects.using(ALIAS).create(user=user, file_name='bench.pdf', status=PDFSummaryJob.STATUS_RUNNING)
+        connections[ALIAS].close()
+
+    def run(self, writers, writes):
+        user_ids = list(User.objects.using(ALIAS).values_list('id', flat=True))
+        connections[ALIAS].close()
+        start = threading.Barrier(writers)
+        results = []
+
+        def writer(number):
+            user_id = user_ids[number % len(user_ids)]
+            latencies, locked = [], 0
+            start.wait()
+            for n in range(writes):
+                started = time.perf_counter()
+                try:
+                    if n % 2:
+                        self.chat_turn(user_id, n)
+                    else:
+                        self.job_progress(user_id, n)
+                    latencies.append(time.perf_counter() - started)
+                except OperationalError as e:
+                    if 'locked' not in str(e) and 'busy' not in str(e):
+                        raise
+                    locked += 1
+            connections[ALIAS].close()
+            results.append((latencies, locked))
+
+        threads = [threading.Thread(target=writer, args=(number,)) for number in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        latencies = sorted(latency for thread_latencies, _ in results for latency in thread_latencies)
+        return latencies, sum(locked for _, locked in results), elapsed
+
+    @staticmethod
+    def chat_turn(user_id, n):
+        # Read, then write in the same transaction: the pattern that fails
+        # outright under deferred transactions when another writer got in first
+        with transaction.atomic(using=ALIAS):
+            conversation = Conversation.objects.using(ALIAS).filter(user_id=user_id).latest('updated_at')
+            ChatMessage.objects.using(ALIAS).create(
+                user_id=user_id, conversation=conversation, message=f'Message {n}', response='Reply ' * 50
+            )
+            Conversation.objects.using(ALIAS).filter(pk=conversation.pk).update(updated_at=timezone.now())
+
+    @staticmethod
+    def job_progress(user_id, n):
+        # A single autocommit write, like the PDF worker saving streamed text
+        PDFSummaryJob.objects.using(ALIAS).filter(user_id=user_id).update(partial_summary='Summary ' * n)
+
+    def report(self, label, result):
+        latencies, locked, elapsed = result
+        if not latencies:
+            self.stdout.write(f'{label:<12} {0:>6} {locked:>7}')
+            return
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f'{label:<12} {len(latencies):>6} {locked:>7} {len(latencies) / elapsed:>9.0f} '
+            f'{statistics.median(latencies) * 1000:>8.1f} {p95 * 1000:>8.1f} {latencies[-1] * 1000:>8.1f}'
+        )
@@ -0,0 +1,75 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from core import ocr
+from core.extractors import PDFExtractor, open_document
+
+from ._corpus import build_pdf
+
+
+class Command(BaseCommand):
+    help = 'Measure page extraction throughput (pages/sec) from one worker process up to N.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Benchmark this PDF instead of a generated one.')
+        parser.add_argument('--kind', choices=['text', 'scanned', 'mixed'], default='mixed',
+                            help='Kind of generated document.')
+        parser.add_argument('--pages', type=int, default=60, help='Pages in the generated document.')
+        parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per worker count; the best is kept.')
+        parser.add_argument('--ocr-backend', choices=['auto', 'mupdf', 'tesseract'],
+                            help='OCR engine to measure (default: PDF_OCR_BACKEND).')
+
+    def handle(self, *args, **options):
+        if options['ocr_backend']:
+            with override_settings(PDF_OCR_BACKEND=options['ocr_backend']):
+                ocr.backend.cache_clear()
+                return self.run(options)
+        return self.run(options)
+
+    def run(self, options):
+        if options['file']:
+            with open(options['file'], 'rb') as f:
+                source = f.read()
+            label = options['file']
+        else:
+            source = build_pdf(options['pages'], options['kind'])
+            label = f"generated {options['kind']} PDF"
+
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= options['max_workers']:
+            worker_counts.append(worker_counts[-1] * 2)
+        if worker_counts[-1] != options['max_workers']:
+            worker_counts.append(options['max_workers'])
+
+        doc = open_document(source)
+        profile = ocr.classify(doc)
+        dpis = sorted({ocr.render_dpi(doc[number]) for number in profile.ocr_pages})
+        doc.close()
+        ocr_count = len(profile.ocr_pages)
+        engine = ocr.backend() or 'none installed'
+        self.stdout.write(f'{label}, best of {options["repeat"]} runs')
+        self.stdout.write(
+            f'{profile.kind} document: {ocr_count} of {len(profile.texts)} pages need OCR'
+            + (f' (engine: {engine}, {"/".join(map(str, dpis))} dpi)' if ocr_count else '')
+        )
+        self.stdout.write(
+            f'{"workers":>8} {"pages":>6} {"seconds":>9} {"pages/sec":>10} {"OCR pages/sec":>14} {"speedup":>8}'
+        )
+        baseline = None
+        for workers in worker_counts:
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                pages = list(PDFExtractor().sections(source, workers=workers))
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            baseline = baseline or best
+            ocr_done = sum(page.method == 'ocr' for page in pages)
+            self.stdout.write(
+                f'{workers:>8} {len(pages):>6} {best:>9.3f} {len(pages) / best:>10.1f} '
+                f'{ocr_done / best:>14.1f} {baseline / best:>7.2f}x'
+            )
@@ -0,0 +1,71 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import extractors
+
+from ._corpus import build_docx, build_pdf, build_pptx
+
+BUILDERS = {
+    '.pdf': build_pdf,
+    '.docx': build_docx,
+    '.pptx': build_pptx,
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure text extraction throughput for every registered document format.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=200,
+                            help='Pages (PDF, Word) or slides (PowerPoint) in each generated document.')
+        parser.add_argument('--file', action='append', default=[],
+                            help='Benchmark this document as well; may be repeated.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per document; the best is kept.')
+
+    def handle(self, *args, **options):
+        documents = [
+            (f'generated {extension}', f'document{extension}', BUILDERS[extension](options['size']))
+            for extension in extractors.extensions() if extension in BUILDERS
+        ]
+        for path in options['file']:
+            if extractors.for_file(path) is None:
+                raise CommandError(f'{path}: unsupported file type (supported: {", ".join(extractors.extensions())})')
+            with open(path, 'rb') as f:
+                documents.append((path, path, f.read()))
+
+        self.stdout.write(f'best of {options["repeat"]} runs; peak is the Python memory held while extracting')
+        self.stdout.write(
+            f'{"document":<18} {"MB":>6} {"sections":>9} {"chars":>10} {"seconds":>8} '
+            f'{"sections/s":>11} {"MB/s":>7} {"peak MB":>8}'
+        )
+        for label, name, data in documents:
+            extractor = extractors.for_file(name)
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                sections, chars = self.consume(extractor, data)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+
+            # A separate run, as tracing slows extraction down
+            tracemalloc.start()
+            self.consume(extractor, data)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            size = len(data) / 1024 / 1024
+            self.stdout.write(
+                f'{label[-18:]:<18} {size:>6.2f} {sections:>9} {chars:>10} {best:>8.3f} '
+                f'{sections / best:>11.1f} {size / best:>7.2f} {peak / 1024 / 1024:>8.1f}'
+            )
+
+    @staticmethod
+    def consume(extractor, data):
+        # Counts the text without keeping it, like a streaming consumer would
+        sections = chars = 0
+        for section in extractor.sections(data, workers=1):
+            sections += 1
+            chars += len(section.text)
+        return sections, chars
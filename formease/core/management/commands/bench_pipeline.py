@@ -0,0 +1,190 @@
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import fitz  # PyMuPDF
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import ocr
+from core.extractors import open_document
+from core.pdf_processing import format_summary
+
+from ._corpus import build_pdf, corpus
+
+# In pipeline order. "numpy" is the copy of a rendered page into an array
+# that array-based OCR engines need; the built-in engines read the pixmap
+# directly, so it is measured for comparison only.
+STAGES = ['open', 'get_text', 'render', 'numpy', 'ocr', 'format']
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _peak_rss_mb():
+    # ru_maxrss can't be reset and a forked child starts from its parent's,
+    # so only the peak of the whole run, documents included, is reported.
+    peak = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KiB elsewhere
+
+
+def measure(name, kind, pages, path, repeat):
+    """Time every stage on one document; runs in a process of its own."""
+    if path:
+        with open(path, 'rb') as f:
+            data = f.read()
+    else:
+        data = build_pdf(pages, kind)
+    gc.collect()
+
+    engine = ocr.backend()
+    colorspace = fitz.csRGB if engine == 'mupdf' else fitz.csGRAY
+    samples = {stage: [] for stage in STAGES}
+    page_count = ocr_count = 0
+
+    def timed(stage, function, *args):
+        started = time.perf_counter()
+        result = function(*args)
+        samples[stage].append(time.perf_counter() - started)
+        return result
+
+    for _ in range(repeat):
+        doc = timed('open', open_document, data)
+        page_count, ocr_count = len(doc), 0
+        for page in doc:
+            text = timed('get_text', page.get_text)
+            if ocr.needs_ocr(text):
+                ocr_count += 1
+                pix = timed('render', ocr.render, page, colorspace)
+                timed('numpy', lambda: np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n))
+                if engine:
+                    # One page per call, so the tesseract engine's process start-up is in every sample
+                    text = timed('ocr', ocr.ocr_pages, [page])[0]
+            timed('format', format_summary, text)
+        doc.close()
+
+    stages = {}
+    for stage, values in samples.items():
+        if not values:
+            continue
+        values.sort()
+        total = sum(values)
+        stages[stage] = {
+            'count': len(values),
+            'seconds': round(total, 6),
+            'per_second': round(len(values) / total, 2) if total else None,
+            'p50_ms': round(_percentile(values, 0.5) * 1000, 4),
+            'p95_ms': round(_percentile(values, 0.95) * 1000, 4),
+        }
+    seconds = sum(stage['seconds'] for stage in stages.values())
+    return {
+        'name': name,
+        'kind': kind,
+        'pages': page_count,
+        'ocr_pages': ocr_count,
+        'megabytes': round(len(data) / 1024 / 1024, 3),
+        'pages_per_second': round(page_count * repeat / seconds, 2),
+        'stages': stages,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Time each stage of PDF extraction (open, get_text, render, numpy conversion, OCR, HTML '
+            'formatting) over a generated corpus and write pages/sec, p50/p95 and the run\'s peak RSS as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=30,
+                            help='Pages in the digital, scanned and mixed documents.')
+        parser.add_argument('--large-pages', type=int, default=500, help='Pages in the large document.')
+        parser.add_argument('--only', action='append', default=[],
+                            help='Run only this corpus document (digital, scanned, mixed, large); may be repeated.')
+        parser.add_argument('--file', action='append', default=[],
+                            help='Benchmark this PDF as well; may be repeated.')
+        parser.add_argument('--repeat', type=int, default=1, help='Passes over each document.')
+        parser.add_argument('--output', help='JSON file to write (default: bench-pipeline-<timestamp>.json).')
+        parser.add_argument('--compare', help='JSON from an earlier run to compare p50 times against.')
+
+    def handle(self, *args, **options):
+        documents = [
+            (name, kind, pages, None)
+            for name, kind, pages in corpus(options['pages'], options['large_pages'])
+            if not options['only'] or name in options['only']
+        ]
+        documents += [(os.path.basename(path), 'file', None, path) for path in options['file']]
+        if not documents:
+            raise CommandError('Nothing to benchmark.')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = {document['name']: document for document in json.load(f)['documents']}
+
+        engine = ocr.backend()
+        created_at = datetime.now(timezone.utc)
+        self.stdout.write(f'OCR engine: {engine or "none installed, OCR stage skipped"}')
+        results = []
+        for document in documents:
+            result = self.run(document, options['repeat'])
+            results.append(result)
+            self.report(result, baseline and baseline.get(result['name']))
+
+        report = {
+            'created_at': created_at.isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'pymupdf': fitz.VersionBind,
+                'numpy': np.__version__,
+                'ocr_engine': engine,
+                'ocr_language': settings.PDF_OCR_LANGUAGE,
+                'ocr_dpi': [settings.PDF_OCR_MIN_DPI, settings.PDF_OCR_MAX_DPI],
+            },
+            'options': {key: options[key] for key in ('pages', 'large_pages', 'repeat')},
+            'peak_rss_mb': round(_peak_rss_mb(), 1),
+            'documents': results,
+        }
+        self.stdout.write(f'\nPeak RSS of the run: {report["peak_rss_mb"]:.0f} MB')
+        output = options['output'] or f'bench-pipeline-{created_at:%Y%m%d-%H%M%S}.json'
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(f'Wrote {output}')
+
+    @staticmethod
+    def run(document, repeat):
+        # A fresh forked process per document, so memory one document leaves
+        # behind doesn't slow the next; in-process where fork isn't available
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            return measure(*document, repeat)
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as pool:
+            return pool.submit(measure, *document, repeat).result()
+
+    def report(self, result, baseline=None):
+        self.stdout.write(
+            f'\n{result["name"]} ({result["kind"]}): {result["pages"]} pages, {result["ocr_pages"]} need OCR, '
+            f'{result["megabytes"]:.2f} MB, {result["pages_per_second"]:.1f} pages/s'
+        )
+        self.stdout.write(
+            f'{"stage":<9} {"count":>6} {"seconds":>9} {"per sec":>10} {"p50 ms":>9} {"p95 ms":>9}'
+            + (f' {"p50 was":>9}' if baseline else '')
+        )
+        for stage in STAGES:
+            timing = result['stages'].get(stage)
+            if timing is None:
+                continue
+            line = (
+                f'{stage:<9} {timing["count"]:>6} {timing["seconds"]:>9.3f} {timing["per_second"] or 0:>10.1f} '
+                f'{timing["p50_ms"]:>9.3f} {timing["p95_ms"]:>9.3f}'
+            )
+            before = baseline and baseline['stages'].get(stage)
+            if before:
+                line += f' {before["p50_ms"]:>9.3f}'
+            self.stdout.write(line)
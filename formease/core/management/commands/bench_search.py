@@ -0,0 +1,97 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core import search
+from core.models import PDFSummary
+
+from ._corpus import LOREM
+
+TOPICS = ['budget', 'contract', 'research', 'invoice', 'thesis', 'policy', 'manual', 'report',
+          'proposal', 'minutes', 'specification', 'audit', 'roadmap', 'survey', 'lecture']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Compare FTS5 search against icontains over a generated set of PDF summaries. '
+            'Everything is inserted in a transaction that is rolled back at the end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--summaries', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=100, help='Owners the summaries are spread over.')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError('Full-text search needs SQLite with FTS5.')
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(0)
+        words = LOREM.split()
+
+        started = time.perf_counter()
+        users = User.objects.bulk_create(
+            User(username=f'bench-search-{n}') for n in range(options['users'])
+        )
+        batch = []
+        for n in range(options['summaries']):
+            topic, other = rng.sample(TOPICS, 2)
+            body = ' '.join(rng.choices(words, k=80))
+            batch.append(PDFSummary(
+                user=users[n % len(users)],
+                file_name=f'{topic}-{n}.pdf',
+                title=f'{topic.title()} {other} {n}',
+                summary=f'<p>{body} {other} {topic}</p><ul><li>{rng.choice(words)} {topic}</li></ul>'
+            ))
+            if len(batch) == 5000:
+                self.insert(batch)
+                batch = []
+        self.insert(batch)
+        self.stdout.write(
+            f'Inserted and indexed {options["summaries"]} summaries in {time.perf_counter() - started:.1f}s'
+        )
+
+        user = users[0]
+        queries = ['budget', 'research audit', 'dolor', 'conseq', 'roadmap minutes']
+        self.stdout.write(f'{"query":<18} {"matches":>8} {"fts5 ms":>9} {"icontains ms":>13} {"speedup":>8}')
+        for query in queries:
+            fts = self.time(options['repeat'], lambda: PDFSummary.search(user, query))
+            scan = self.time(options['repeat'], lambda: list(
+                PDFSummary.objects.filter(user=user).filter(
+                    Q(title__icontains=query) | Q(file_name__icontains=query) | Q(summary__icontains=query)
+                ).order_by('-created_at')[:100]
+            ))
+            matches = len(PDFSummary.search(user, query))
+            self.stdout.write(
+                f'{query:<18} {matches:>8} {fts * 1000:>9.2f} {scan * 1000:>13.2f} {scan / fts:>7.1f}x'
+            )
+
+    @staticmethod
+    def insert(batch):
+        # bulk_create sends no post_save signals, so index the rows here
+        created = PDFSummary.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            search.index_rows(cursor, [(s.pk, s.user_id, s.title, s.file_name, s.summary) for s in created])
+
+    @staticmethod
+    def time(repeat, run):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
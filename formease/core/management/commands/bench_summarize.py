@@ -0,0 +1,63 @@
+import statistics
+import time
+from contextlib import nullcontext
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+
+from core import pdf_processing
+from core.extractors import PDFExtractor
+
+from ._corpus import build_pdf
+
+
+class Command(BaseCommand):
+    help = ('Compare generating the title and summary back-to-back against generating them '
+            'concurrently. Talks to the configured Ollama model unless --fake-latency is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Summarize this PDF instead of a generated one.')
+        parser.add_argument('--pages', type=int, default=5, help='Pages in the generated document.')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--fake-latency', type=float,
+                            help='Replace each LLM call with a sleep of this many seconds.')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            source = options['file']
+        else:
+            source = build_pdf(options['pages'], 'text')
+        sections = [page.text for page in PDFExtractor().sections(source, workers=1)]
+        text = "".join(sections)
+
+        def sequential():
+            return pdf_processing.generate_title(text), pdf_processing.generate_summary(text, sections)
+
+        def concurrent():
+            return pdf_processing.summarize(text, sections)
+
+        patch = nullcontext()
+        if options['fake_latency']:
+            patch = mock.patch.object(pdf_processing, '_chat', self.fake_chat(options['fake_latency']))
+        with patch:
+            timings = {'sequential': [], 'concurrent': []}
+            for _ in range(options['repeat']):
+                for name, run in (('sequential', sequential), ('concurrent', concurrent)):
+                    started = time.perf_counter()
+                    run()
+                    timings[name].append(time.perf_counter() - started)
+
+        self.stdout.write(f'{"path":<12} {"median s":>9} {"min s":>8} {"max s":>8}')
+        for name, values in timings.items():
+            self.stdout.write(
+                f'{name:<12} {statistics.median(values):>9.2f} {min(values):>8.2f} {max(values):>8.2f}'
+            )
+        saved = statistics.median(timings['sequential']) - statistics.median(timings['concurrent'])
+        self.stdout.write(f'Concurrent generation saves {saved:.2f}s per document (median)')
+
+    @staticmethod
+    def fake_chat(latency):
+        def chat(prompt, on_delta=None, task='summary'):
+            time.sleep(latency)
+            return 'Generated text'
+        return chat
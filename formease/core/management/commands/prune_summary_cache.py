@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import qa
+from core.models import ExtractedDocument, SummaryCacheEntry
+from core.pdf_processing import pipeline_version
+
+
+class Command(BaseCommand):
+    help = ('Evict summary cache entries left behind by an older model/prompt version, '
+            'unused for too long, or beyond the size limit (least recently used first), '
+            'then extracted text and document Q&A indexes no summary uses any more.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int, default=settings.PDF_SUMMARY_CACHE_MAX_AGE_DAYS)
+        parser.add_argument('--max-entries', type=int, default=settings.PDF_SUMMARY_CACHE_MAX_ENTRIES)
+        parser.add_argument('--all', action='store_true', help='Empty the cache completely.')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            deleted, _ = SummaryCacheEntry.objects.all().delete()
+        else:
+            deleted = SummaryCacheEntry.prune(
+                pipeline_version(),
+                max_age_days=options['max_age_days'],
+                max_entries=options['max_entries']
+            )
+        self.stdout.write(f'Removed {deleted} summary cache entries')
+        # Text a running job stored is not linked to a summary until the job is done
+        documents = ExtractedDocument.prune(min_age=timedelta(seconds=settings.PDF_JOB_TIMEOUT))
+        self.stdout.write(f'Removed {documents} extracted documents')
+        self.stdout.write(f'Removed {qa.prune_indexes()} document Q&A indexes')
@@ -0,0 +1,62 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import qa
+from core.models import PDFSummaryJob
+from core.pdf_processing import process_job
+
+
+class Command(BaseCommand):
+    help = ('Process queued PDF summary jobs, and document Q&A indexes when no summary is waiting. '
+            'Run as many copies as you like, on one or more hosts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling for new jobs.')
+        parser.add_argument('--poll-interval', type=float,
+                            default=getattr(settings, 'PDF_JOB_POLL_INTERVAL', 2),
+                            help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--worker-id', default=f'{socket.gethostname()}:{os.getpid()}',
+                            help='Name recorded on claimed jobs (defaults to host:pid).')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        worker_id = options['worker_id']
+        self.stdout.write(f'PDF worker {worker_id} started')
+
+        while not self.stopping:
+            close_old_connections()
+            PDFSummaryJob.requeue_stale()
+
+            job = PDFSummaryJob.claim_next(worker_id)
+            if job is None:
+                if qa.build_next_index():
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            started = time.monotonic()
+            process_job(job)
+            self.stdout.write(
+                f'Job {job.pk} ({job.file_name}) -> {job.status} in {time.monotonic() - started:.1f}s'
+            )
+            if job.status == PDFSummaryJob.STATUS_QUEUED:
+                # Put back for a retry; give the backend a moment before trying again
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(f'PDF worker {worker_id} stopped')
+
+    def stop(self, signum, frame):
+        # Finish the job in hand, then exit
+        self.stopping = True
@@ -0,0 +1,35 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.warmup import keep_alive_loop, readiness, warm_models, warm_up
+
+
+class Command(BaseCommand):
+    help = ('Load the configured Ollama models into memory, e.g. as a deploy step. '
+            'With --loop, keep pinging them so they are never unloaded.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and re-warm the models every --interval seconds.')
+        parser.add_argument('--interval', type=float, default=settings.LLM_KEEP_ALIVE_INTERVAL,
+                            help='Seconds between keep-alive pings with --loop.')
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+            signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+            self.stdout.write(f'Keeping {", ".join(warm_models())} loaded every {options["interval"]:g}s')
+            keep_alive_loop(stop, options['interval'])
+            return
+
+        errors = warm_up()
+        ready, models = readiness()
+        for model, resident in models.items():
+            state = 'loaded' if resident else f'NOT loaded ({errors.get(model, "not listed by the backend")})'
+            self.stdout.write(f'{model}: {state}')
+        if not ready:
+            raise CommandError('Some models could not be loaded')
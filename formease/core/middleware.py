@@ -0,0 +1,43 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from django.template.defaultfilters import filesizeformat
+
+
+class UploadSizeLimitMiddleware:
+    """Reject request bodies larger than ``FILE_UPLOAD_MAX_SIZE`` before they are read.
+
+    Django never reads past Content-Length (a body without one is treated
+    as empty), so checking the header bounds what is read. Under WSGI this
+    runs before anything touches the body, so an oversized upload is never
+    read. Under ASGI Django has already buffered the body by now, so also
+    cap it at the proxy (e.g. nginx ``client_max_body_size``).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def check(self, request):
+        max_size = settings.FILE_UPLOAD_MAX_SIZE
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > max_size:
+            return HttpResponse(
+                f'Uploads are limited to {filesizeformat(max_size)}.', status=413, content_type='text/plain'
+            )
+        return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.check(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.check(request) or await self.get_response(request)
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_pdfsummaryjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfsummaryjob',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='SummaryCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('pipeline_version', models.CharField(max_length=100)),
+                ('text', models.TextField()),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('summary', models.TextField()),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Summary cache entries',
+                'indexes': [models.Index(fields=['last_used_at'], name='core_summar_last_us_859316_idx')],
+            },
+        ),
+    ]
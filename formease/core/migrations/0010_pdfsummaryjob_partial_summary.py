@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_summarycacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfsummaryjob',
+            name='partial_summary',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 03:56
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_pdfsummaryjob_partial_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfsummaryjob',
+            name='data',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='pdfsummaryjob',
+            name='upload',
+            field=models.FileField(blank=True, upload_to=core.models.pdf_job_upload_path),
+        ),
+    ]
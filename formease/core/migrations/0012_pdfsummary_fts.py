@@ -0,0 +1,62 @@
+import html
+import sqlite3
+from contextlib import closing
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+# Frozen copies of core/search.py as of this migration, so later changes to
+# the app can't change what it does
+TABLE = 'core_pdfsummary_fts'
+
+
+def fts5_available(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with closing(sqlite3.connect(':memory:')) as db:
+        try:
+            db.execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+        except sqlite3.OperationalError:
+            return False
+    return True
+
+
+def plain_text(value):
+    return html.unescape(strip_tags(value or ''))
+
+
+def create_index(apps, schema_editor):
+    if not fts5_available(schema_editor.connection):
+        return
+    PDFSummary = apps.get_model('core', 'PDFSummary')
+    rows = PDFSummary.objects.using(schema_editor.connection.alias).values_list(
+        'id', 'user_id', 'title', 'file_name', 'summary'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} "
+            f"USING fts5(owner, title, file_name, summary, tokenize='porter unicode61')"
+        )
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {TABLE} (rowid, owner, title, file_name, summary) VALUES (%s, %s, %s, %s, %s)",
+            [
+                (pk, f'u{user_id}', plain_text(title), file_name, plain_text(summary))
+                for pk, user_id, title, file_name, summary in rows.iterator(chunk_size=2000)
+            ]
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_pdfsummaryjob_data'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
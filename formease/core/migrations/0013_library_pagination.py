@@ -0,0 +1,83 @@
+# Generated by Django 5.2 on 2026-10-18 04:12
+
+from html import unescape
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+
+def make_excerpt(value):
+    # Frozen copy of core.models.make_excerpt as of this migration
+    text = ' '.join(unescape(strip_tags(value or '')).split())
+    return Truncator(text).chars(200)
+
+
+def fill_list_columns(apps, schema_editor):
+    # Historical models have no custom save(), so compute the new columns here
+    db = schema_editor.connection.alias
+    Resume = apps.get_model('core', 'Resume')
+    PDFSummary = apps.get_model('core', 'PDFSummary')
+
+    resumes = []
+    for resume in Resume.objects.using(db).only('summary', 'education', 'experience', 'skills').iterator(chunk_size=500):
+        resume.excerpt = make_excerpt(resume.summary)
+        resume.education_count = len(resume.education or [])
+        resume.experience_count = len(resume.experience or [])
+        resume.skills_count = len(resume.skills or [])
+        resumes.append(resume)
+    Resume.objects.using(db).bulk_update(
+        resumes, ['excerpt', 'education_count', 'experience_count', 'skills_count'], batch_size=500
+    )
+
+    summaries = []
+    for summary in PDFSummary.objects.using(db).only('summary').iterator(chunk_size=500):
+        summary.excerpt = make_excerpt(summary.summary)
+        summaries.append(summary)
+    PDFSummary.objects.using(db).bulk_update(summaries, ['excerpt'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_pdfsummary_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfsummary',
+            name='excerpt',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='resume',
+            name='education_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='resume',
+            name='excerpt',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='resume',
+            name='experience_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='resume',
+            name='skills_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='pdfsummary',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='core_pdfsum_user_id_acb65b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resume',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='core_resume_user_id_fe55b6_idx'),
+        ),
+        migrations.RunPython(fill_list_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+def fill_content_hash(apps, schema_editor):
+    # Summaries made by the worker can be traced back through their job
+    db = schema_editor.connection.alias
+    PDFSummary = apps.get_model('core', 'PDFSummary')
+    PDFSummaryJob = apps.get_model('core', 'PDFSummaryJob')
+
+    jobs = PDFSummaryJob.objects.using(db).exclude(result=None).exclude(content_hash='')
+    for result_id, content_hash in jobs.values_list('result_id', 'content_hash').iterator():
+        PDFSummary.objects.using(db).filter(pk=result_id).update(content_hash=content_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_library_pagination'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfsummary',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_pdfsummary_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_hash', models.CharField(max_length=64, unique=True)),
+                ('page_count', models.PositiveIntegerField(default=0)),
+                ('ocr_page_count', models.PositiveIntegerField(default=0)),
+                ('char_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='summarycacheentry',
+            name='text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='pdfsummary',
+            name='document',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='summaries', to='core.extracteddocument'),
+        ),
+        migrations.AddField(
+            model_name='summarycacheentry',
+            name='document',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cache_entries', to='core.extracteddocument'),
+        ),
+        migrations.CreateModel(
+            name='ExtractedPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('method', models.CharField(choices=[('text', 'Text layer'), ('ocr', 'OCR')], max_length=10)),
+                ('compressed_text', models.BinaryField()),
+                ('char_count', models.PositiveIntegerField(default=0)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='core.extracteddocument')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('document', 'number'), name='unique_page_number')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_extracted_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentIndexJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('summary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.pdfsummary')),
+            ],
+        ),
+    ]
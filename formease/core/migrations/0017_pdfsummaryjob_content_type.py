@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_documentindexjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfsummaryjob',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_pdfsummaryjob_content_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfsummaryjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,8 +1,25 @@
-from django.db import models
+import os
+import uuid
+import zlib
+from datetime import timedelta
+from html import unescape
+
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models import Q
-from django.db.models.signals import post_save
+from django.db.models import F, Q
+from django.utils import timezone
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+EXCERPT_LENGTH = 200
+
+def make_excerpt(value):
+    """Short plain-text preview of ``value`` (HTML or escaped text) for list pages"""
+    text = ' '.join(unescape(strip_tags(value or '')).split())
+    return Truncator(text).chars(EXCERPT_LENGTH)
 
 class UserProfile(models.Model):
     GENDER_CHOICES = [
@@ -31,14 +48,25 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+    @classmethod
+    def for_user(cls, user):
+        """The user's profile, created if missing.
+
+        Cached on ``user`` (for ``request.user``, the rest of the request),
+        so templates reading ``user.userprofile`` don't query it again.
+        """
+        try:
+            return user.userprofile
+        except cls.DoesNotExist:
+            return cls.objects.get_or_create(user=user)[0]
+
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
-    """Create or update UserProfile when User is created/updated"""
+def create_user_profile(sender, instance, created, **kwargs):
+    """Create the UserProfile of a new User"""
+    # Other saves (every login updates last_login) leave the profile alone;
+    # UserProfile.for_user creates any that is still missing
     if created:
         UserProfile.objects.create(user=instance)
-    else:
-        # Update the profile if it exists, create it if it doesn't
-        UserProfile.objects.get_or_create(user=instance)
 
 class Resume(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -63,31 +91,454 @@ class Resume(models.Model):
     
     # Generated Content
     generated_content = models.TextField(blank=True, null=True)
+
+    # Precomputed for "My Resumes", which never loads the JSON or HTML columns
+    excerpt = models.CharField(max_length=255, blank=True)
+    education_count = models.PositiveSmallIntegerField(default=0)
+    experience_count = models.PositiveSmallIntegerField(default=0)
+    skills_count = models.PositiveSmallIntegerField(default=0)
+
+    # Columns the resume list needs
+    LIST_FIELDS = ['id', 'created_at', 'full_name', 'excerpt', 'education_count', 'experience_count', 'skills_count']
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', 'created_at', 'id'])]
     
     def __str__(self):
         return f"{self.full_name}'s Resume - {self.created_at.strftime('%Y-%m-%d')}"
 
+    def save(self, *args, **kwargs):
+        self.excerpt = make_excerpt(self.summary)
+        self.education_count = len(self.education or [])
+        self.experience_count = len(self.experience or [])
+        self.skills_count = len(self.skills or [])
+        super().save(*args, **kwargs)
+
+@receiver(post_save, sender=Resume)
+def prerender_resume_pdf(sender, instance, **kwargs):
+    """Render the downloadable PDF in the background once the save is committed"""
+    if not settings.RESUME_PDF_PRERENDER or not instance.generated_content:
+        return
+    from .resume import queue_prerender
+
+    transaction.on_commit(lambda: queue_prerender(instance.pk))
+
+class ExtractedDocument(models.Model):
+    """The text of an uploaded file, kept page by page so it is never parsed twice.
+
+    Keyed by the SHA-256 of the file bytes alone, so it survives changes to
+    the summary model or prompts: summaries, cache entries and Q&A indexes
+    of the same file all read this one copy instead of running PyMuPDF and
+    Tesseract again.
+    """
+    file_hash = models.CharField(max_length=64, unique=True)
+    page_count = models.PositiveIntegerField(default=0)
+    ocr_page_count = models.PositiveIntegerField(default=0)
+    char_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.file_hash[:12]} ({self.page_count} pages)"
+
+    @classmethod
+    def store(cls, file_hash, sections):
+        """Save ``sections`` (extractor ``Section``s) as the text of ``file_hash``.
+
+        Returns the document; if another worker stored the same file first,
+        theirs is kept.
+        """
+        with transaction.atomic():
+            document, created = cls.objects.get_or_create(file_hash=file_hash)
+            if not created:
+                return document
+            pages = [ExtractedPage.from_section(document, section) for section in sections]
+            ExtractedPage.objects.bulk_create(pages, batch_size=200)
+            document.page_count = len(pages)
+            document.ocr_page_count = sum(page.method == ExtractedPage.METHOD_OCR for page in pages)
+            document.char_count = sum(page.char_count for page in pages)
+            document.save(update_fields=['page_count', 'ocr_page_count', 'char_count'])
+        return document
+
+    @classmethod
+    def prune(cls, min_age):
+        """Delete documents no summary or cache entry uses, once ``min_age`` old.
+
+        The age keeps the text a running job has just stored, before its
+        summary exists.
+        """
+        return cls.objects.filter(
+            summaries=None, cache_entries=None, created_at__lt=timezone.now() - min_age
+        ).delete()[0]
+
+    def sections(self, start=1, stop=None):
+        """Pages ``start`` to ``stop`` (inclusive) as ``Section``s, decompressed one at a time."""
+        pages = self.pages.filter(number__gte=start).order_by('number')
+        if stop is not None:
+            pages = pages.filter(number__lte=stop)
+        for page in pages.iterator(chunk_size=200):
+            yield page.section()
+
+
+class ExtractedPage(models.Model):
+    METHOD_TEXT = 'text'
+    METHOD_OCR = 'ocr'
+    METHOD_CHOICES = [
+        (METHOD_TEXT, 'Text layer'),
+        (METHOD_OCR, 'OCR'),
+    ]
+
+    document = models.ForeignKey(ExtractedDocument, on_delete=models.CASCADE, related_name='pages')
+    number = models.PositiveIntegerField()  # page, slide or section number, from 1
+    method = models.CharField(max_length=10, choices=METHOD_CHOICES)
+    compressed_text = models.BinaryField()  # zlib-compressed UTF-8
+    char_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['document', 'number'], name='unique_page_number')]
+
+    def __str__(self):
+        return f"{self.document} page {self.number} ({self.method})"
+
+    @classmethod
+    def from_section(cls, document, section):
+        return cls(
+            document=document,
+            number=section.number,
+            method=section.method,
+            compressed_text=zlib.compress(section.text.encode()),
+            char_count=len(section.text)
+        )
+
+    @property
+    def text(self):
+        return zlib.decompress(self.compressed_text).decode()
+
+    def section(self):
+        from .extractors import Section
+        return Section(self.number, self.text, self.method)
+
 class PDFSummary(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     file_name = models.CharField(max_length=255)
     title = models.CharField(max_length=255, blank=True, null=True)  # Made nullable for existing records
     summary = models.TextField()
+    excerpt = models.CharField(max_length=255, blank=True)  # plain-text preview for list pages
+    content_hash = models.CharField(max_length=64, blank=True)  # the SummaryCacheEntry and Q&A index it came from
+    document = models.ForeignKey(
+        ExtractedDocument, on_delete=models.SET_NULL, null=True, blank=True, related_name='summaries'
+    )
+
+    # Columns the summary list needs; the body is fetched when a summary is opened
+    LIST_FIELDS = ['id', 'created_at', 'file_name', 'title', 'excerpt']
     
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'PDF Summaries'
+        indexes = [models.Index(fields=['user', 'created_at', 'id'])]
     
     def __str__(self):
         return self.title or self.file_name  # Fall back to file_name if title is None
+
+    def save(self, *args, **kwargs):
+        self.excerpt = make_excerpt(self.summary)
+        super().save(*args, **kwargs)
         
     @classmethod
-    def search(cls, user, query):
-        return cls.objects.filter(
-            user=user
-        ).filter(
-            Q(title__icontains=query) | Q(file_name__icontains=query)
+    def search(cls, user, query, limit=None):
+        """The user's summaries matching ``query``, most relevant first.
+
+        Uses the FTS5 index on SQLite (see core/search.py); each result
+        carries a ``snippet`` of the summary with the matches in ``<mark>``.
+        """
+        from . import search
+
+        limit = limit or settings.PDF_SUMMARY_SEARCH_LIMIT
+        if not search.enabled():
+            return list(cls.objects.filter(
+                user=user
+            ).only(*cls.LIST_FIELDS).filter(
+                Q(title__icontains=query) | Q(file_name__icontains=query) | Q(summary__icontains=query)
+            ).order_by('-created_at')[:limit])
+
+        matches = search.search(user.pk, query, limit)
+        summaries = cls.objects.only(*cls.LIST_FIELDS).in_bulk([pk for pk, _ in matches])
+        results = []
+        for pk, snippet in matches:
+            # A summary deleted without the signal firing (raw SQL, a restored backup) leaves a stale row
+            summary = summaries.get(pk)
+            if summary is None:
+                continue
+            summary.snippet = snippet
+            results.append(summary)
+        return results
+
+@receiver(post_save, sender=PDFSummary)
+def index_pdf_summary(sender, instance, **kwargs):
+    """Keep the full-text index in step with the summary"""
+    from . import search
+    if search.enabled():
+        search.index_summary(instance)
+
+@receiver(post_delete, sender=PDFSummary)
+def unindex_pdf_summary(sender, instance, **kwargs):
+    from . import search
+    if search.enabled():
+        search.remove_summary(instance.pk)
+
+def pdf_job_upload_path(instance, filename):
+    # Unique names: two uploads called "report.pdf" never collide or get renamed
+    extension = os.path.splitext(filename)[1].lower()
+    return f'pdf_jobs/{uuid.uuid4().hex}{extension}'
+
+class PDFSummaryJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    file_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)  # of the upload, for names without an extension
+    # Small uploads are kept in the row itself, larger ones in a file
+    data = models.BinaryField(null=True, blank=True)
+    upload = models.FileField(upload_to=pdf_job_upload_path, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    result = models.OneToOneField(PDFSummary, on_delete=models.SET_NULL, null=True, blank=True, related_name='job')
+    error = models.TextField(blank=True)
+    partial_summary = models.TextField(blank=True)  # raw model output streamed so far
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # last sign of life from the worker running it
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+    @staticmethod
+    def max_attempts():
+        return getattr(settings, 'PDF_JOB_MAX_ATTEMPTS', 3)
+
+    @classmethod
+    def claim_next(cls, worker):
+        """Atomically move the oldest queued job to running and return it.
+
+        The conditional UPDATE is what makes this safe for any number of
+        workers sharing the database: only one of them can flip a given row
+        out of the queued state, the others simply try the next job.
+        """
+        while True:
+            job = cls.objects.filter(status=cls.STATUS_QUEUED).order_by('created_at', 'id').first()
+            if job is None:
+                return None
+            now = timezone.now()
+            claimed = cls.objects.filter(pk=job.pk, status=cls.STATUS_QUEUED).update(
+                status=cls.STATUS_RUNNING,
+                worker=worker,
+                started_at=now,
+                heartbeat_at=now,
+                attempts=F('attempts') + 1
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+
+    @classmethod
+    def requeue_stale(cls):
+        """Put back jobs whose worker died mid-run (crash, OOM kill, lost host).
+
+        A job is stale once its worker has shown no sign of life (see
+        ``save_progress``) for PDF_JOB_TIMEOUT, however long it has run.
+        """
+        timeout = getattr(settings, 'PDF_JOB_TIMEOUT', 30 * 60)
+        cutoff = timezone.now() - timedelta(seconds=timeout)
+        stale = cls.objects.filter(status=cls.STATUS_RUNNING).filter(
+            Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at=None, started_at__lt=cutoff)
+        )
+        requeued = stale.filter(attempts__lt=cls.max_attempts()).update(status=cls.STATUS_QUEUED, worker='')
+        for job in stale.filter(attempts__gte=cls.max_attempts()).defer('data'):
+            job.finish(cls.STATUS_FAILED, error='Processing took too long. Please try again.')
+        return requeued
+
+    def _held(self):
+        # This run of the job, as long as no other worker has taken it over
+        return type(self).objects.filter(
+            pk=self.pk, status=self.STATUS_RUNNING, worker=self.worker, started_at=self.started_at
+        )
+
+    def requeue(self, count_attempt=True):
+        attempts = self.attempts if count_attempt else max(self.attempts - 1, 0)
+        if self._held().update(status=self.STATUS_QUEUED, worker='', partial_summary='', attempts=attempts):
+            self.status = self.STATUS_QUEUED
+            self.worker = ''
+            self.partial_summary = ''
+            self.attempts = attempts
+
+    def attach(self, uploaded_file):
+        """Keep ``uploaded_file`` for the worker without copying it around.
+
+        An upload Django kept in memory is stored as bytes in the row. One
+        it spooled to a temporary file is moved (renamed when on the same
+        filesystem) into media storage by the FileField.
+        """
+        if uploaded_file.size <= settings.PDF_UPLOAD_INLINE_MAX_SIZE and not hasattr(uploaded_file, 'temporary_file_path'):
+            uploaded_file.seek(0)
+            self.data = uploaded_file.read()
+        else:
+            self.upload = uploaded_file
+
+    def document(self):
+        """The uploaded PDF as bytes or as a path, whichever it was stored as."""
+        if self.data is not None:
+            return bytes(self.data)
+        return self.upload.path
+
+    def save_progress(self, partial_summary):
+        """Store the text streamed so far and mark the job as alive.
+
+        Called every PDF_JOB_PROGRESS_INTERVAL while the summary is written;
+        the row is only touched when the text changed or the last heartbeat
+        is PDF_JOB_HEARTBEAT_INTERVAL old.
+        """
+        now = timezone.now()
+        interval = timedelta(seconds=getattr(settings, 'PDF_JOB_HEARTBEAT_INTERVAL', 30))
+        if partial_summary == self.partial_summary and self.heartbeat_at and now - self.heartbeat_at < interval:
+            return
+        if self._held().update(partial_summary=partial_summary, heartbeat_at=now):
+            self.partial_summary = partial_summary
+            self.heartbeat_at = now
+
+    def finish(self, status, error='', result=None):
+        """Record the outcome, unless another worker has taken the job over.
+
+        A job that ran past PDF_JOB_TIMEOUT without a heartbeat may have been
+        requeued and claimed again; then only that run may finish it, and
+        this returns False without changing anything.
+        """
+        finished_at = timezone.now()
+        # The upload is only needed while the job can still run
+        finished = self._held().update(
+            status=status, error=error, partial_summary='', finished_at=finished_at, result=result,
+            data=None, upload='', content_hash=self.content_hash
+        )
+        if not finished:
+            return False
+        self.status = status
+        self.error = error
+        self.partial_summary = ''
+        self.finished_at = finished_at
+        self.result = result
+        self.data = None
+        if self.upload:
+            self.upload.delete(save=False)
+        return True
+
+
+class DocumentIndexJob(models.Model):
+    """A document Q&A index waiting to be built by ``run_pdf_worker``.
+
+    A question about a document without an index queues one of these
+    rather than embedding the whole document inside the request (see
+    core/qa.py). ``key`` names the index; rows are deleted once built.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    summary = models.ForeignKey(PDFSummary, on_delete=models.CASCADE, related_name='+')  # where the text comes from
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Index {self.key[:12]} ({'running' if self.started_at else 'queued'})"
+
+    @classmethod
+    def claim_next(cls):
+        """Atomically take the oldest job no live worker holds, or return None.
+
+        Jobs started longer than PDF_JOB_TIMEOUT ago are assumed abandoned.
+        """
+        cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'PDF_JOB_TIMEOUT', 30 * 60))
+        while True:
+            job = cls.objects.filter(
+                Q(started_at=None) | Q(started_at__lt=cutoff)
+            ).order_by('created_at', 'id').first()
+            if job is None:
+                return None
+            started_at = timezone.now()
+            if cls.objects.filter(pk=job.pk, started_at=job.started_at).update(started_at=started_at):
+                job.started_at = started_at
+                return job
+
+class SummaryCacheEntry(models.Model):
+    """Extraction and LLM output shared by every upload of the same document.
+
+    ``content_hash`` covers the file bytes *and* the pipeline version (model
+    plus prompt version), so changing either setting simply stops old entries
+    from matching; ``prune_summary_cache`` then deletes them. The extracted
+    text lives on in ``document``, so the next upload skips extraction.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    pipeline_version = models.CharField(max_length=100)
+    document = models.ForeignKey(
+        ExtractedDocument, on_delete=models.SET_NULL, null=True, blank=True, related_name='cache_entries'
+    )
+    text = models.TextField(blank=True)  # only for entries made before ``document``; the text lives there now
+    title = models.CharField(max_length=255, blank=True)
+    summary = models.TextField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['last_used_at'])]
+        verbose_name_plural = 'Summary cache entries'
+
+    def __str__(self):
+        return f"{self.title or self.content_hash[:12]} ({self.pipeline_version})"
+
+    @classmethod
+    def lookup(cls, content_hash):
+        """Return the entry for ``content_hash`` and record the hit, or None."""
+        entry = cls.objects.filter(content_hash=content_hash).first()
+        if entry is not None:
+            cls.objects.filter(pk=entry.pk).update(hit_count=F('hit_count') + 1, last_used_at=timezone.now())
+        return entry
+
+    @classmethod
+    def prune(cls, current_version, max_age_days=None, max_entries=None):
+        """Evict stale entries and return how many rows were deleted.
+
+        Entries from other pipeline versions go first, then anything unused
+        for ``max_age_days``, then the least recently used rows beyond
+        ``max_entries``.
+        """
+        deleted, _ = cls.objects.exclude(pipeline_version=current_version).delete()
+        if max_age_days:
+            cutoff = timezone.now() - timedelta(days=max_age_days)
+            deleted += cls.objects.filter(last_used_at__lt=cutoff).delete()[0]
+        if max_entries is not None:
+            keep = cls.objects.order_by('-last_used_at').values_list('pk', flat=True)[:max_entries]
+            deleted += cls.objects.exclude(pk__in=list(keep)).delete()[0]
+        return deleted
+
+    def create_summary(self, user, file_name):
+        return PDFSummary.objects.create(
+            user=user,
+            file_name=file_name,
+            title=self.title,
+            summary=self.summary,
+            content_hash=self.content_hash,
+            document_id=self.document_id
         )
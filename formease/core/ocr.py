@@ -0,0 +1,175 @@
+"""OCR for scanned PDF pages.
+
+``classify()`` looks at a whole document once, up front, and reports which
+pages have no usable text layer, so digital documents never pay for OCR
+and scanned ones can be sent straight to the OCR pool.
+
+Pages are rendered at a resolution adapted to the scan itself (there is
+nothing to gain from rendering a 150 dpi scan at 300 dpi) and capped in
+pixel count for oversized pages. Two engines are supported:
+
+``tesseract``
+    The ``tesseract`` command, run once per batch of pages with a list
+    file instead of once per page, on grayscale images, so the engine and
+    its language model are loaded once per batch.
+``mupdf``
+    MuPDF's built-in Tesseract, run in-process through
+    ``Pixmap.pdfocr_tobytes``. Needs only the language data
+    (``tessdata``), but every call sets up a new Tesseract engine, page
+    after page on one thread, and its OCR writer only reads RGB
+    pixmaps (a grayscale one comes back with no text). A fallback for hosts
+    without the command.
+
+``auto`` (the default) uses the first one available. Tesseract and its
+language data are looked up on the usual Linux, macOS and Windows paths,
+or set ``PDF_OCR_TESSDATA`` / ``TESSERACT_CMD``.
+"""
+import functools
+import glob
+import logging
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import namedtuple
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DIGITAL = 'digital'
+SCANNED = 'scanned'
+MIXED = 'mixed'
+
+DocumentProfile = namedtuple('DocumentProfile', ['kind', 'texts', 'ocr_pages'])
+
+_TESSDATA_GLOBS = [
+    '/usr/share/tesseract-ocr/*/tessdata',
+    '/usr/share/tesseract-ocr/tessdata',
+    '/usr/share/tessdata',
+    '/usr/local/share/tessdata',
+    '/opt/homebrew/share/tessdata',
+    r'C:\Program Files\Tesseract-OCR\tessdata',
+]
+
+
+class OCRUnavailable(Exception):
+    """No OCR engine is installed."""
+
+
+def needs_ocr(text):
+    """Too little text for the page to be anything but an image."""
+    return len(text.strip()) < settings.PDF_OCR_MIN_TEXT_CHARS
+
+
+def classify(doc):
+    """Read every page's text layer and say which pages need OCR."""
+    texts = [page.get_text() for page in doc]
+    ocr_pages = [number for number, text in enumerate(texts) if needs_ocr(text)]
+    if not ocr_pages:
+        kind = DIGITAL
+    elif len(ocr_pages) == len(texts):
+        kind = SCANNED
+    else:
+        kind = MIXED
+    return DocumentProfile(kind, texts, ocr_pages)
+
+
+def render_dpi(page):
+    """Resolution to render ``page`` at for OCR.
+
+    Follows the resolution of the largest image on the page, within
+    ``PDF_OCR_MIN_DPI``..``PDF_OCR_MAX_DPI``, and never produces more than
+    ``PDF_OCR_MAX_PIXELS`` pixels.
+    """
+    dpi = settings.PDF_OCR_MAX_DPI
+    width_in, height_in = page.rect.width / 72, page.rect.height / 72
+    images = page.get_images(full=True)
+    if images and width_in:
+        largest_width = max(image[2] for image in images)
+        dpi = max(settings.PDF_OCR_MIN_DPI, min(dpi, largest_width / width_in))
+    if width_in * height_in:
+        dpi = min(dpi, math.sqrt(settings.PDF_OCR_MAX_PIXELS / (width_in * height_in)))
+    return max(int(dpi), 72)
+
+
+def render(page, colorspace=fitz.csGRAY):
+    return page.get_pixmap(dpi=render_dpi(page), colorspace=colorspace, alpha=False)
+
+
+@functools.lru_cache(maxsize=None)
+def tesseract_cmd():
+    """Path to the tesseract executable, or ``None``."""
+    return getattr(settings, 'TESSERACT_CMD', None) or shutil.which('tesseract')
+
+
+@functools.lru_cache(maxsize=None)
+def tessdata_dir():
+    """Folder holding ``<language>.traineddata``, or ``None``."""
+    language = settings.PDF_OCR_LANGUAGE.split('+')[0]
+    candidates = [getattr(settings, 'PDF_OCR_TESSDATA', None), os.environ.get('TESSDATA_PREFIX')]
+    cmd = tesseract_cmd()
+    if cmd:
+        prefix = os.path.dirname(os.path.dirname(os.path.realpath(cmd)))
+        candidates += glob.glob(os.path.join(prefix, 'share', 'tesseract-ocr', '*', 'tessdata'))
+        candidates.append(os.path.join(prefix, 'share', 'tessdata'))
+        candidates.append(os.path.join(os.path.dirname(os.path.realpath(cmd)), 'tessdata'))
+    for pattern in _TESSDATA_GLOBS:
+        candidates += sorted(glob.glob(pattern), reverse=True)  # newest version first
+    for candidate in candidates:
+        if candidate and os.path.isfile(os.path.join(candidate, f'{language}.traineddata')):
+            return candidate
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def backend():
+    """The OCR engine to use: ``'mupdf'``, ``'tesseract'`` or ``None``."""
+    choice = settings.PDF_OCR_BACKEND
+    if choice in ('auto', 'tesseract') and tesseract_cmd():
+        return 'tesseract'
+    if choice in ('auto', 'mupdf') and tessdata_dir():
+        return 'mupdf'
+    logger.warning('No OCR engine found (PDF_OCR_BACKEND=%s); scanned pages will have no text', choice)
+    return None
+
+
+def _ocr_mupdf(pages):
+    texts = []
+    for page in pages:
+        pdf = render(page, fitz.csRGB).pdfocr_tobytes(language=settings.PDF_OCR_LANGUAGE, tessdata=tessdata_dir())
+        with fitz.open(stream=pdf, filetype='pdf') as ocr_doc:
+            texts.append(ocr_doc[0].get_text())
+    return texts
+
+
+def _ocr_tesseract(pages):
+    # One tesseract run for the whole batch: it reads the image list and
+    # separates the pages of its output with form feeds.
+    with tempfile.TemporaryDirectory(prefix='formease-ocr-') as workdir:
+        paths = []
+        for index, page in enumerate(pages):
+            path = os.path.join(workdir, f'{index:05d}.png')
+            render(page).save(path)
+            paths.append(path)
+        list_path = os.path.join(workdir, 'pages.txt')
+        with open(list_path, 'w') as f:
+            f.write('\n'.join(paths) + '\n')
+        result = subprocess.run(
+            [tesseract_cmd(), list_path, 'stdout', '-l', settings.PDF_OCR_LANGUAGE],
+            capture_output=True, check=True, text=True
+        )
+    texts = result.stdout.split('\f')
+    return (texts + [''] * len(pages))[:len(pages)]
+
+
+def ocr_pages(pages):
+    """OCR text for each of ``pages`` (PyMuPDF pages of one document)."""
+    engine = backend()
+    if engine is None:
+        raise OCRUnavailable('No OCR engine is installed')
+    if engine == 'mupdf':
+        return _ocr_mupdf(pages)
+    return _ocr_tesseract(pages)
@@ -0,0 +1,82 @@
+"""Keyset ("cursor") pagination for the per-user libraries.
+
+Pages are addressed by the ``(created_at, id)`` of the row at their edge
+rather than by an offset, so page 500 costs the same as page 1: the
+``(user, created_at, id)`` index takes the query straight to the first
+row of the page. Cursors are opaque to the browser and a malformed one
+simply means the first page.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_other_pages(self):
+        return bool(self.next_cursor or self.previous_cursor)
+
+
+def encode_cursor(obj):
+    position = f'{obj.created_at.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """``(created_at, pk)`` from a cursor, or ``None`` if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        position = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = position.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except ValueError:
+        return None
+
+
+def keyset_page(queryset, after=None, before=None, per_page=20):
+    """One page of ``queryset``, newest first.
+
+    ``after`` gives the page of older rows following a cursor, ``before``
+    the page of newer rows preceding one; with neither this is the first
+    page.
+    """
+    before_position = decode_cursor(before)
+    after_position = decode_cursor(after)
+
+    if before_position:
+        created_at, pk = before_position
+        rows = list(queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+        ).order_by('created_at', 'pk')[:per_page + 1])
+        has_newer = len(rows) > per_page
+        items = rows[:per_page][::-1]
+        return Page(
+            items,
+            next_cursor=encode_cursor(items[-1]) if items else None,
+            previous_cursor=encode_cursor(items[0]) if has_newer else None
+        )
+
+    queryset = queryset.order_by('-created_at', '-pk')
+    if after_position:
+        created_at, pk = after_position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    rows = list(queryset[:per_page + 1])
+    items = rows[:per_page]
+    return Page(
+        items,
+        next_cursor=encode_cursor(items[-1]) if len(rows) > per_page else None,
+        previous_cursor=encode_cursor(items[0]) if after_position and items else None
+    )
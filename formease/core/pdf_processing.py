@@ -0,0 +1,329 @@
+"""Document summarization pipeline used by the background worker.
+
+The HTTP view only queues a PDFSummaryJob; everything slow (text extraction,
+OCR and the Ollama calls) happens here, inside ``manage.py run_pdf_worker``.
+Despite the name, jobs take any format in ``core.extractors``.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+from django.conf import settings
+from django.db import transaction
+
+from . import extractors
+from .llm import LLMUnavailable, get_client
+from .models import ExtractedDocument, PDFSummaryJob, SummaryCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+class PDFProcessingError(Exception):
+    """A permanent failure whose message can be shown to the user as-is."""
+
+
+def pipeline_version():
+    """Identifies everything besides the file that shapes a cached summary."""
+    return f"{settings.PDF_SUMMARY_MODEL}:{settings.PDF_SUMMARY_PROMPT_VERSION}"
+
+
+def content_hash(chunks):
+    """SHA-256 over the pipeline version and the file bytes, fed in chunks."""
+    digest = hashlib.sha256(pipeline_version().encode() + b'\0')
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_hash(chunks):
+    """SHA-256 of the file bytes alone, identifying its ``ExtractedDocument``."""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_document(job):
+    """The ``ExtractedDocument`` for the job's file, extracting and storing it on first sight."""
+    digest = file_hash([job.data] if job.data is not None else job.upload.chunks())
+    document = ExtractedDocument.objects.filter(file_hash=digest).first()
+    if document is None:
+        # Resolved as the upload was, so a name without an extension still finds its extractor
+        extractor = extractors.for_file(job.file_name, job.content_type)
+        if extractor is None:
+            raise PDFProcessingError('This file type is not supported.')
+        # Extract before storing: OCR can take minutes, too long to hold a write transaction
+        document = ExtractedDocument.store(digest, list(extractor.sections(job.document())))
+    return document
+
+
+def _chat(prompt, on_delta=None, task='summary'):
+    """Send one prompt to the summary model and return the reply.
+
+    With ``on_delta`` the reply is streamed and every piece is passed to the
+    callback as it arrives.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    client = get_client()
+    # Without it Ollama cuts the prompt down to its default context, without an error
+    options = {'num_ctx': settings.PDF_SUMMARY_NUM_CTX}
+    if on_delta is None:
+        return client.chat(messages, settings.PDF_SUMMARY_MODEL, task=task, options=options).strip()
+
+    pieces = []
+    for piece in client.stream_chat(messages, settings.PDF_SUMMARY_MODEL, task=task, options=options):
+        pieces.append(piece)
+        on_delta(piece)
+    return "".join(pieces).strip()
+
+
+def generate_title(text):
+    title_prompt = (
+        "Do not add any prefixes or suffixes like '(Note: I've kept it concise while still capturing the main topic and purpose of the document)' or 'Here is a well-formatted summary of the text using HTML markup:' Based on the following text, generate a concise but descriptive title "
+        "that summarizes the main topic or purpose of the document (maximum 5-7 words):\n\n"
+        f"{text[:1000]}"  # Use first 1000 characters for title generation
+    )
+
+    generated_title = _chat(title_prompt, task='title')
+
+    # Clean up the title
+    if generated_title.startswith('"') and generated_title.endswith('"'):
+        generated_title = generated_title[1:-1]
+    return generated_title.strip()
+
+
+def summary_prompt(text):
+    return (
+        "Create a well-formatted summary of the following text using HTML markup. Follow these rules:\n"
+        "1. Use h2 tags for main sections\n"
+        "2. Use h3 tags for subsections\n"
+        "3. Use p tags for paragraphs\n"
+        "4. Use ul/li tags for lists where appropriate\n"
+        "5. Use div class='highlight' for important points\n"
+        "6. Make it easy to read and understand\n"
+        "7. Group related information under appropriate sections\n"
+        "Text to summarize:\n\n"
+        f"{text}"
+    )
+
+
+def chunk_prompt(text, part, parts):
+    return (
+        f"The following text is part {part} of {parts} of a longer document. "
+        "Summarize it as concise plain-text notes. Keep section headings, key facts, "
+        "names, figures and conclusions; leave out filler. Do not add any prefix or suffix.\n\n"
+        f"{text}"
+    )
+
+
+def estimate_tokens(text):
+    return len(text) // settings.PDF_SUMMARY_CHARS_PER_TOKEN
+
+
+def split_chunks(sections, max_tokens):
+    """Pack ``sections`` (pages, in order) into chunks of at most ``max_tokens``.
+
+    Chunks break on page boundaries; a single page over budget is split on
+    paragraph breaks, then on line breaks, and as a last resort hard-cut.
+    """
+    max_chars = max_tokens * settings.PDF_SUMMARY_CHARS_PER_TOKEN
+    chunks = []
+    current = ""
+
+    def pieces(section):
+        if len(section) <= max_chars:
+            yield section
+            return
+        for separator in ('\n\n', '\n'):
+            parts = section.split(separator)
+            # A trailing separator alone would split off nothing and recurse forever
+            if sum(1 for part in parts if part) > 1:
+                # Separators go back where they were, so the pieces add up to the section
+                for part in parts[:-1]:
+                    yield from pieces(part + separator)
+                if parts[-1]:
+                    yield from pieces(parts[-1])
+                return
+        for start in range(0, len(section), max_chars):
+            yield section[start:start + max_chars]
+
+    for section in sections:
+        for piece in pieces(section):
+            if current and len(current) + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current += piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+def generate_summary(text, sections=None, on_delta=None):
+    """Summarize ``text`` into HTML.
+
+    Text that fits in one prompt takes the single-call fast path. Longer
+    documents are map-reduced: ``sections`` (the page texts, when known) are
+    packed into token-budgeted chunks, the chunks are summarized
+    concurrently, and the combined notes are summarized into the final HTML,
+    repeating the map step if the notes are themselves still too long.
+    Only the final call is streamed to ``on_delta``.
+    """
+    max_tokens = settings.PDF_SUMMARY_CHUNK_TOKENS
+    while estimate_tokens(text) > max_tokens:
+        chunks = split_chunks(sections or [text], max_tokens)
+        with ThreadPoolExecutor(max_workers=settings.PDF_SUMMARY_CONCURRENCY) as pool:
+            prompts = [chunk_prompt(chunk, part, len(chunks)) for part, chunk in enumerate(chunks, 1)]
+            notes = list(pool.map(_chat, prompts))
+        sections = [note + '\n\n' for note in notes]
+        text = "".join(sections)
+        if len(chunks) == 1:
+            # A single chunk can't be merged any further
+            break
+
+    return format_summary(_chat(summary_prompt(text), on_delta))
+
+
+def summarize(text, sections=None, on_delta=None):
+    """Return ``(title, summary)`` for ``text``.
+
+    Both generations depend only on the extracted text, so they run side by
+    side and the document costs one LLM round trip less than doing them in
+    turn. Ollama serves them in parallel as long as OLLAMA_NUM_PARALLEL > 1.
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        title = pool.submit(generate_title, text)
+        summary = pool.submit(generate_summary, text, sections, on_delta)
+        return title.result(), summary.result()
+
+
+class SummaryFormatter:
+    """Applies the plain-text to HTML fallback formatting as text streams in.
+
+    Output is emitted one complete line at a time. Whether the model wrote
+    HTML itself is decided from the first non-blank character, as before.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.is_html = None
+        self.in_list = False
+
+    def feed(self, text):
+        self.buffer += text
+        if self.is_html is None:
+            if not self.buffer.strip():
+                return ""
+            self.is_html = self.buffer.lstrip().startswith('<')
+        *lines, self.buffer = self.buffer.split('\n')
+        return "".join(line + '\n' for line in self._format(lines))
+
+    def close(self):
+        lines, self.buffer = [self.buffer], ""
+        if self.is_html is None:
+            self.is_html = lines[0].lstrip().startswith('<')
+        formatted = self._format(lines)
+        if self.in_list:
+            formatted.append('</ul>')
+            self.in_list = False
+        return "".join(line + '\n' for line in formatted)
+
+    def _format(self, lines):
+        if self.is_html:
+            return lines
+
+        formatted_lines = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('•') or line.startswith('-'):
+                if not self.in_list:
+                    formatted_lines.append('<ul>')
+                    self.in_list = True
+                formatted_lines.append(f'<li>{line.lstrip("•- ")}</li>')
+            else:
+                if self.in_list:
+                    formatted_lines.append('</ul>')
+                    self.in_list = False
+                formatted_lines.append(f'<p>{line}</p>')
+        return formatted_lines
+
+
+def format_summary(summary):
+    """Wrap plain-text model output in HTML when the model ignored the markup rules."""
+    formatter = SummaryFormatter()
+    return (formatter.feed(summary) + formatter.close()).rstrip('\n')
+
+
+def process_job(job):
+    """Run a claimed job to completion and record the outcome on the job row.
+
+    Permanent problems (no extractable text) fail the job straight away; any
+    other error puts it back on the queue until it runs out of attempts.
+    """
+    document = None
+    try:
+        if not job.content_hash:
+            job.content_hash = content_hash([job.data] if job.data is not None else job.upload.chunks())
+
+        # An identical upload may have been summarized while this job waited
+        entry = SummaryCacheEntry.lookup(job.content_hash)
+        if entry is None:
+            # Text stored by an earlier upload of the file, e.g. before a prompt change, is reused as is
+            document = extract_document(job)
+            sections = [page.text for page in document.sections()]
+            text = "".join(sections)
+            if not text.strip():
+                raise PDFProcessingError(
+                    'Could not extract any text from the document. Please make sure the file contains readable text.'
+                )
+
+            # Stream the summary into the job row so the page can show it as
+            # it is written; the row is only touched from this thread.
+            streamed = []
+            interval = getattr(settings, 'PDF_JOB_PROGRESS_INTERVAL', 0.5)
+            with ThreadPoolExecutor(max_workers=1) as runner:
+                future = runner.submit(summarize, text, sections, streamed.append)
+                while True:
+                    try:
+                        title, summary = future.result(timeout=interval)
+                        break
+                    except FuturesTimeoutError:
+                        job.save_progress("".join(streamed))
+            entry, _ = SummaryCacheEntry.objects.get_or_create(
+                content_hash=job.content_hash,
+                defaults={
+                    'pipeline_version': pipeline_version(),
+                    'document': document,
+                    'title': title,
+                    'summary': summary
+                }
+            )
+
+        with transaction.atomic():
+            result = entry.create_summary(job.user, job.file_name)
+            if not job.finish(PDFSummaryJob.STATUS_DONE, result=result):
+                # Requeued and claimed by another worker, whose result counts
+                logger.warning('PDF summary job %s was taken over by another worker; dropping this result', job.pk)
+                transaction.set_rollback(True)
+    except PDFProcessingError as e:
+        job.finish(PDFSummaryJob.STATUS_FAILED, error=str(e))
+    except LLMUnavailable:
+        # The backend is down, not the document: retry later without using up an attempt
+        logger.warning('LLM unavailable, putting PDF summary job %s back on the queue', job.pk)
+        job.requeue(count_attempt=False)
+    except Exception:
+        logger.exception('PDF summary job %s failed on attempt %s', job.pk, job.attempts)
+        if job.attempts < job.max_attempts():
+            job.requeue()
+            return job
+        job.finish(
+            PDFSummaryJob.STATUS_FAILED,
+            error='An error occurred while generating the summary. Please try again.'
+        )
+    if document is not None and job.status == PDFSummaryJob.STATUS_DONE:
+        # Embedding a long document takes a while: queued, so it runs once no summary is waiting
+        from . import qa
+        qa.queue_index(job.result)
+    return job
@@ -0,0 +1,280 @@
+"""Question answering over the text of a summarized document.
+
+A document is split into chunks of about DOCUMENT_QA_CHUNK_TOKENS, embedded
+once through Ollama's ``/api/embed`` and stored under DOCUMENT_INDEX_DIR:
+
+    vectors.npy  float32 matrix, one L2-normalized row per chunk
+    pages.npy    page, slide or section number of every chunk (0 if unknown)
+    offsets.npy  where each chunk starts in chunks.txt, plus the end
+    chunks.txt   the chunk texts, UTF-8, back to back
+
+A question is embedded, scored against the memory-mapped matrix and only
+the DOCUMENT_QA_TOP_K best chunks are read back and sent to the model, so
+the prompt, and the time the model spends on it, stay the same however
+long the document is.
+
+Indexes are keyed by the hash of the file bytes, like its extracted text,
+and the embedding model, so every summary of the same file shares one and
+a change to the summary prompts or model doesn't make them all stale.
+Summaries from before the text was stored fall back to their content hash.
+"""
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .extractors import Section
+from .llm import get_async_client, get_client
+from .models import DocumentIndexJob, PDFSummary, SummaryCacheEntry
+from .pdf_processing import split_chunks
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = '1'  # bump when chunking or the file layout changes
+
+Hit = namedtuple('Hit', ['page', 'text', 'score'])
+
+
+class QAError(Exception):
+    """The question can't be answered; the message can be shown to the user as-is."""
+
+
+class QAIndexing(QAError):
+    """The document's index is queued or being built; ask again shortly."""
+    retry_after = 5  # seconds
+
+
+def index_key(summary):
+    """The hash ``summary``'s index is stored under."""
+    if summary.document_id is not None:
+        return summary.document.file_hash
+    return summary.content_hash
+
+
+def index_path(key):
+    model = re.sub(r'[^\w.-]', '_', settings.DOCUMENT_QA_EMBED_MODEL)
+    return os.path.join(settings.DOCUMENT_INDEX_DIR, f'{key}-{model}-{INDEX_VERSION}')
+
+
+def chunk_sections(sections):
+    """``(number, text)`` for every chunk of ``sections``, in document order.
+
+    Chunks never span two sections, so each one can cite its page.
+    """
+    for section in sections:
+        for chunk in split_chunks([section.text], settings.DOCUMENT_QA_CHUNK_TOKENS):
+            chunk = chunk.strip()
+            if chunk:
+                yield section.number, chunk
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class DocumentIndex:
+    def __init__(self, path):
+        self.path = path
+        # Memory-mapped: nothing is read until a question is scored, and the
+        # OS page cache keeps hot documents in memory across processes
+        self.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        self.pages = np.load(os.path.join(path, 'pages.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, vector, k):
+        """The ``k`` chunks closest to ``vector`` as ``Hit``s, best first."""
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        scores = self.vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+
+        hits = []
+        with open(os.path.join(self.path, 'chunks.txt'), 'rb') as f:
+            for i in top:
+                f.seek(self.offsets[i])
+                text = f.read(self.offsets[i + 1] - self.offsets[i]).decode()
+                hits.append(Hit(int(self.pages[i]), text, float(scores[i])))
+        return hits
+
+
+def build_index(key, sections):
+    """Embed ``sections`` (``Section``s, in order) and store them as the index for ``key``.
+
+    The files are written to a scratch directory that is renamed into place
+    once complete, so readers never see half an index; if another process
+    got there first, its index is kept.
+    """
+    chunks = list(chunk_sections(sections))
+    if not chunks:
+        raise QAError('There is no text in this document to answer questions from.')
+
+    os.makedirs(settings.DOCUMENT_INDEX_DIR, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix='.build-', dir=settings.DOCUMENT_INDEX_DIR)
+    try:
+        client = get_client()
+        batch = settings.DOCUMENT_QA_EMBED_BATCH
+        offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        vectors = None
+        with open(os.path.join(workdir, 'chunks.txt'), 'wb') as f:
+            for start in range(0, len(chunks), batch):
+                texts = [text for _, text in chunks[start:start + batch]]
+                embedded = np.asarray(client.embed(texts, settings.DOCUMENT_QA_EMBED_MODEL), dtype=np.float32)
+                if vectors is None:
+                    # Written straight to disk, a batch at a time
+                    vectors = np.lib.format.open_memmap(
+                        os.path.join(workdir, 'vectors.npy'), mode='w+',
+                        dtype=np.float32, shape=(len(chunks), embedded.shape[1])
+                    )
+                vectors[start:start + len(texts)] = _normalize(embedded)
+                for i, text in enumerate(texts, start):
+                    data = text.encode()
+                    f.write(data)
+                    offsets[i + 1] = offsets[i] + len(data)
+        vectors.flush()
+        del vectors
+        np.save(os.path.join(workdir, 'offsets.npy'), offsets)
+        np.save(os.path.join(workdir, 'pages.npy'), np.array([number or 0 for number, _ in chunks], dtype=np.int32))
+
+        path = index_path(key)
+        try:
+            os.replace(workdir, path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+            shutil.rmtree(workdir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    return DocumentIndex(path)
+
+
+def queue_index(summary):
+    """Have the worker index ``summary``'s document, unless it already is or will be."""
+    key = index_key(summary)
+    if not os.path.isdir(index_path(key)):
+        DocumentIndexJob.objects.get_or_create(key=key, defaults={'summary': summary})
+
+
+def _sections(summary):
+    """The text to index for ``summary``: its stored pages, or the summary cache's copy for older ones."""
+    if summary.document_id is not None:
+        return list(summary.document.sections())
+    entry = SummaryCacheEntry.objects.filter(content_hash=summary.content_hash).only('text').first()
+    if entry is None or not entry.text:
+        raise QAError("This document's text is no longer available. Upload it again to ask questions about it.")
+    # Older cache entries keep the text without page breaks, so these chunks can't cite pages
+    return [Section(0, entry.text, 'text')]
+
+
+def open_index(summary):
+    """The index for ``summary``'s document.
+
+    If there is none yet, it is queued for the worker and ``QAIndexing``
+    is raised: embedding a long document takes far longer than a request
+    should, and would hold up every other request waiting on the thread.
+    """
+    key = index_key(summary)
+    path = index_path(key)
+    if os.path.isdir(path):
+        return DocumentIndex(path)
+    if summary.document_id is None and not SummaryCacheEntry.objects.filter(
+        content_hash=summary.content_hash
+    ).exclude(text='').exists():
+        raise QAError("This document's text is no longer available. Upload it again to ask questions about it.")
+    queue_index(summary)
+    raise QAIndexing('This document is being prepared for questions. Your answer will follow shortly.')
+
+
+def build_next_index():
+    """Build one queued index in the worker; returns False when the queue is empty."""
+    job = DocumentIndexJob.claim_next()
+    if job is None:
+        return False
+    try:
+        if not os.path.isdir(index_path(job.key)):
+            build_index(job.key, _sections(job.summary))
+    except Exception:
+        # The next question queues it again
+        logger.exception('Could not build document index %s', job.key[:12])
+    finally:
+        job.delete()
+    return True
+
+
+def prune_indexes(max_build_age=24 * 60 * 60):
+    """Delete indexes no summary uses any more, or built by another model or version.
+
+    Returns how many were removed. Scratch directories are left alone until
+    ``max_build_age`` seconds old, as a worker may still be writing them.
+    """
+    root = settings.DOCUMENT_INDEX_DIR
+    if not os.path.isdir(root):
+        return 0
+    in_use = set(
+        PDFSummary.objects.exclude(document=None).values_list('document__file_hash', flat=True).distinct()
+    )
+    in_use.update(
+        PDFSummary.objects.filter(document=None).exclude(content_hash='').values_list('content_hash', flat=True).distinct()
+    )
+    removed = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith('.build-'):
+            if time.time() - os.path.getmtime(path) < max_build_age:
+                continue
+        else:
+            key = name.split('-', 1)[0]
+            if key in in_use and path == index_path(key):
+                continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def _cite(page):
+    return f'Page {page}' if page else 'Excerpt'
+
+
+def question_prompt(title, question, hits):
+    # Excerpts go in document order, which reads better than score order
+    excerpts = "\n\n".join(f"[{_cite(hit.page)}]\n{hit.text}" for hit in sorted(hits, key=lambda hit: hit.page))
+    return (
+        f'Answer the question using only the excerpts below from the document "{title}". '
+        "If they don't contain the answer, say that the document doesn't say. "
+        "Mention the pages you used, like (page 3). Do not add any prefix.\n\n"
+        f"{excerpts}\n\n"
+        f"Question: {question}"
+    )
+
+
+async def answer(summary, question):
+    """Answer ``question`` about ``summary``'s document from its most relevant chunks."""
+    if not summary.content_hash:
+        raise QAError('Questions can only be asked about documents summarized after this feature was added. '
+                      'Upload the document again to ask about it.')
+    index = await sync_to_async(open_index)(summary)
+    client = get_async_client()
+    vector = (await client.embed([question], settings.DOCUMENT_QA_EMBED_MODEL))[0]
+    # Scoring touches only the memory map, so it needn't queue behind the main thread
+    hits = await sync_to_async(index.search, thread_sensitive=False)(vector, settings.DOCUMENT_QA_TOP_K)
+
+    prompt = question_prompt(summary.title or summary.file_name, question, hits)
+    reply = await client.chat([{'role': 'user', 'content': prompt}], settings.DOCUMENT_QA_MODEL, task='answer')
+    return {
+        'answer': reply.strip(),
+        'sources': [{'page': hit.page or None, 'score': round(hit.score, 3)} for hit in hits],
+        'prompt_chars': len(prompt),
+    }
@@ -0,0 +1,178 @@
+"""Resume rendering.
+
+The HTML structure comes from the ``core/resume_content.html`` template,
+so every resume has the same markup. The model only rewrites the
+free-text fields that benefit from it: the professional summary and each
+experience description. Those rewrites are short and independent, so they
+run concurrently.
+
+Downloadable PDFs are rendered once per version of a resume and kept on
+disk in ``RESUME_PDF_CACHE_DIR``, keyed by id and ``updated_at``.
+"""
+import asyncio
+import glob
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from html import unescape
+
+from django.conf import settings
+from django.db import connection
+from django.template.loader import get_template, render_to_string
+from django.utils.html import escape
+from xhtml2pdf import pisa
+
+from .llm import LLMError, get_async_client
+
+logger = logging.getLogger(__name__)
+
+# Bump when resume_pdf.html changes so cached PDFs are rendered again
+PDF_LAYOUT_VERSION = 1
+
+# Pre-rendering shares a few threads; ids waiting there aren't queued twice
+_prerender_pool = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'RESUME_PDF_PRERENDER_WORKERS', 2), thread_name_prefix='resume-pdf'
+)
+_prerender_pending = set()
+_prerender_lock = threading.Lock()
+
+# A leading "Here is the rewritten summary:" style line
+_PREAMBLE = re.compile(r'^\s*(here\s+is|here\'s|sure)[^\n]*:\s*\n', re.IGNORECASE)
+
+
+def summary_prompt(summary):
+    return f"""Rewrite the following professional summary for a resume. Keep it to 2-4 sentences, in the first person without pronouns, and keep every fact. Reply with the rewritten summary only, as plain text.
+
+{summary}"""
+
+
+def description_prompt(experience):
+    return f"""Rewrite the following description of the role "{experience['title']}" at {experience['company']} for a resume. Use concise, achievement-focused sentences and keep every fact. Reply with the rewritten description only, as plain text.
+
+{experience['description']}"""
+
+
+def clean(text):
+    text = _PREAMBLE.sub('', text.strip(), count=1)
+    return text.strip().strip('"').strip()
+
+
+async def polish(text, prompt):
+    """The model's rewrite of ``text``, or ``text`` itself if it is empty or the call fails."""
+    if not text.strip():
+        return text
+    try:
+        rewritten = await get_async_client().chat(
+            [{"role": "user", "content": prompt}],
+            settings.RESUME_MODEL,
+            task='resume'
+        )
+    except LLMError as e:
+        logger.warning('Resume polishing failed, keeping the original text: %s', e)
+        return text
+    # The form data is stored HTML-escaped; keep the rewrite consistent with it
+    return escape(clean(rewritten)) or text
+
+
+async def polish_resume(data):
+    """A copy of ``data`` with the summary and experience descriptions rewritten."""
+    # The prompts get the user's own text, not its HTML-escaped form
+    jobs = [polish(data['summary'], summary_prompt(unescape(data['summary'])))]
+    for exp in data['experience']:
+        exp_text = {key: unescape(value) for key, value in exp.items()}
+        jobs.append(polish(exp['description'], description_prompt(exp_text)))
+    summary, *descriptions = await asyncio.gather(*jobs)
+
+    return dict(
+        data,
+        summary=summary,
+        experience=[dict(exp, description=description) for exp, description in zip(data['experience'], descriptions)]
+    )
+
+
+def render_resume(data):
+    """The resume HTML for ``data`` (form data, already HTML-escaped)."""
+    return render_to_string('core/resume_content.html', data).strip()
+
+
+class PDFRenderError(Exception):
+    """xhtml2pdf could not turn the resume into a PDF."""
+
+
+def pdf_version(resume):
+    """Identifies one rendering of ``resume``; doubles as its ETag."""
+    return f'{resume.pk}-{resume.updated_at.timestamp():.6f}-{PDF_LAYOUT_VERSION}'
+
+
+def _pdf_path(resume):
+    return os.path.join(settings.RESUME_PDF_CACHE_DIR, f'{pdf_version(resume)}.pdf')
+
+
+def render_resume_pdf(resume):
+    html = get_template('core/resume_pdf.html').render({'resume_content': resume.generated_content})
+    output = io.BytesIO()
+    if pisa.CreatePDF(html, dest=output).err:
+        raise PDFRenderError(f'Could not render resume {resume.pk} as PDF')
+    return output.getvalue()
+
+
+def get_resume_pdf(resume):
+    """The PDF bytes for ``resume``, rendered only if this version is not cached yet."""
+    path = _pdf_path(resume)
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    pdf = render_resume_pdf(resume)
+    os.makedirs(settings.RESUME_PDF_CACHE_DIR, exist_ok=True)
+    # Write then rename, so a concurrent reader never sees a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=settings.RESUME_PDF_CACHE_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+
+    # Older versions of this resume will never be asked for again
+    for stale in glob.glob(os.path.join(settings.RESUME_PDF_CACHE_DIR, f'{resume.pk}-*.pdf')):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+    return pdf
+
+
+def queue_prerender(resume_id):
+    """Pre-render a just-saved resume's PDF on the shared pool.
+
+    Saves in quick succession coalesce: a resume still waiting in the queue
+    is rendered once, from whatever version is current when its turn comes.
+    """
+    with _prerender_lock:
+        if resume_id in _prerender_pending:
+            return
+        _prerender_pending.add(resume_id)
+    _prerender_pool.submit(prerender_resume_pdf, resume_id)
+
+
+def prerender_resume_pdf(resume_id):
+    """Fill the PDF cache for a just-saved resume; run on the pre-render pool."""
+    from .models import Resume
+
+    # A save from here on queues another run, which will see its changes
+    with _prerender_lock:
+        _prerender_pending.discard(resume_id)
+    try:
+        resume = Resume.objects.filter(pk=resume_id).first()
+        if resume is not None and resume.generated_content:
+            get_resume_pdf(resume)
+    except Exception:
+        logger.exception('Pre-rendering the PDF of resume %s failed', resume_id)
+    finally:
+        # The pool thread's connection is not managed by a request cycle
+        connection.close()
@@ -0,0 +1,124 @@
+"""Full-text search over PDF summaries.
+
+On SQLite the summaries are indexed in the FTS5 table ``core_pdfsummary_fts``
+(rowid = PDFSummary id) holding the plain text of the title, file name and
+summary, plus an ``owner`` token. Searching for the owner token together
+with the user's words lets FTS5 intersect both posting lists, so a query
+only ranks the user's own matches instead of every user's. Model signals keep it in step with the summaries table; the
+``0012_pdfsummary_fts`` migration creates and backfills it. Matches are
+ranked with bm25, title hits weighing most, and come with a highlighted
+snippet of the summary.
+
+Other database backends, and SQLite libraries built without FTS5, fall
+back to ``icontains`` matching.
+"""
+import functools
+import html
+import logging
+import re
+import sqlite3
+from contextlib import closing
+
+from django.db import connection
+from django.utils.html import escape, strip_tags
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'core_pdfsummary_fts'
+
+# bm25 weights for the owner, title, file_name and summary columns
+WEIGHTS = (0.0, 10.0, 5.0, 1.0)
+
+# Private-use characters mark matches in snippets until the text is escaped
+_MARK_START, _MARK_END = '\ue000', '\ue001'
+
+_WORD = re.compile(r'\w+')
+
+
+@functools.lru_cache(maxsize=None)
+def fts5_available():
+    """Whether the SQLite library Django runs on has FTS5 compiled in."""
+    # Probed on a private in-memory database: nothing touches the app's one
+    with closing(sqlite3.connect(':memory:')) as db:
+        try:
+            db.execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+        except sqlite3.OperationalError:
+            logger.warning('SQLite was built without FTS5; summary search falls back to icontains matching')
+            return False
+    return True
+
+
+def enabled(using=None):
+    return (using or connection).vendor == 'sqlite' and fts5_available()
+
+
+def plain_text(value):
+    """What gets indexed: the text of ``value`` without markup or entities."""
+    return html.unescape(strip_tags(value or ''))
+
+
+def create_table(cursor):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} "
+        f"USING fts5(owner, title, file_name, summary, tokenize='porter unicode61')"
+    )
+
+
+def _owner(user_id):
+    return f'u{user_id}'
+
+
+def index_rows(cursor, rows):
+    """Add or replace ``(id, user_id, title, file_name, summary_html)`` rows in the index."""
+    cursor.executemany(
+        f"INSERT OR REPLACE INTO {TABLE} (rowid, owner, title, file_name, summary) VALUES (%s, %s, %s, %s, %s)",
+        [
+            (pk, _owner(user_id), plain_text(title), file_name, plain_text(summary))
+            for pk, user_id, title, file_name, summary in rows
+        ]
+    )
+
+
+def index_summary(summary):
+    with connection.cursor() as cursor:
+        index_rows(cursor, [(summary.pk, summary.user_id, summary.title, summary.file_name, summary.summary)])
+
+
+def remove_summary(pk):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [pk])
+
+
+def fts_query(query):
+    """Turn free text into an FTS5 query: every word, as a prefix, must appear
+    in the title, file name or summary.
+
+    Quoting each word keeps FTS5 operators and punctuation typed by the
+    user from being parsed as query syntax.
+    """
+    words = ' '.join(f'"{word}"*' for word in _WORD.findall(query))
+    return f'{{title file_name summary}} : ({words})' if words else ''
+
+
+def highlight(snippet):
+    """Escape a snippet, then turn the match markers into ``<mark>`` tags."""
+    return escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def search(user_id, query, limit):
+    """``[(id, snippet_html)]`` of the user's best matches for ``query``, best first."""
+    match = fts_query(query)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT rowid, snippet({TABLE}, 3, %s, %s, '…', 24)
+            FROM {TABLE}
+            WHERE {TABLE} MATCH %s
+            ORDER BY bm25({TABLE}, %s, %s, %s, %s)
+            LIMIT %s
+            """,
+            [_MARK_START, _MARK_END, f'owner : {_owner(user_id)} AND {match}', *WEIGHTS, limit]
+        )
+        return [(pk, highlight(snippet)) for pk, snippet in cursor.fetchall()]
@@ -0,0 +1,20 @@
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream(request, events, aevents):
+    """Server-sent events response fed by ``events``, or by the async
+    iterator ``aevents`` when the request is served over ASGI."""
+    # Under ASGI a streaming response must be fed by an async iterator,
+    # otherwise Django buffers the whole stream before sending it.
+    stream = aevents if isinstance(request, ASGIRequest) else events
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
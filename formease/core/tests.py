@@ -1,3 +1,792 @@
-from django.test import TestCase
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import docx
+import fitz  # PyMuPDF
+import pptx
+import requests
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import extractors, llm, ocr, pdf_processing, qa, resume, search
+from .extractors import Section
+from .llm import AsyncLLMClient, CircuitBreaker, LLMClient, LLMError
+from .middleware import UploadSizeLimitMiddleware
+from .models import (
+    DocumentIndexJob, ExtractedDocument, PDFSummary, PDFSummaryJob, Resume, SummaryCacheEntry, UserProfile
+)
+from .pdf_processing import split_chunks
+
+
+# Per-test caches, so a session cached by one test never leaks into the next
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+    for alias in settings.CACHES
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QueryBudgetTestCase(TestCase):
+    """Pins the number of queries each page costs.
+
+    A logged-in request reads the user and, while its session is cached,
+    nothing else from the session table; each view adds what it needs.
+    """
+
+    def setUp(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        self.user = User.objects.create_user('alice', password='secret-pass', first_name='Alice')
+        self.client.force_login(self.user)
+        # The first request loads the session into the cache
+        self.client.get(reverse('home'))
+
+
+@override_settings(PDF_SUMMARY_CHARS_PER_TOKEN=4)
+class SplitChunksTests(SimpleTestCase):
+    def test_line_over_budget_ending_in_a_newline(self):
+        # Nothing to split on but the trailing newline: hard-cut, not recursion
+        section = 'x' * 100 + '\n'
+        chunks = split_chunks([section], 10)
+        self.assertEqual(''.join(chunks), section)
+        self.assertTrue(all(len(chunk) <= 40 for chunk in chunks))
+
+    def test_pieces_add_up_to_the_section(self):
+        section = 'First paragraph here.\n\n' + 'word ' * 12 + '\nlast line'
+        chunks = split_chunks([section], 10)
+        self.assertEqual(''.join(chunks), section)
+        self.assertTrue(all(len(chunk) <= 40 for chunk in chunks))
+
+
+class SummaryContextTests(SimpleTestCase):
+    def test_summary_calls_ask_for_a_context_that_fits_a_chunk(self):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'message': {'content': 'Notes'}}
+        with mock.patch.object(LLMClient, 'post', return_value=response) as post:
+            pdf_processing._chat(pdf_processing.chunk_prompt('Text', 1, 2))
+        num_ctx = post.call_args.args[1]['options']['num_ctx']
+        # A full chunk, the instructions around it and some room for the reply
+        chunk = 'x' * settings.PDF_SUMMARY_CHUNK_TOKENS * settings.PDF_SUMMARY_CHARS_PER_TOKEN
+        prompt = pdf_processing.summary_prompt(chunk)
+        self.assertGreaterEqual(num_ctx, pdf_processing.estimate_tokens(prompt) + 1024)
+
+
+class LLMClientTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self.client = LLMClient(
+            'http://llm.invalid', {'default': (1, 1)}, max_retries=0, retry_backoff=0, pool_size=1, breaker=self.breaker
+        )
+
+    def reply(self, body):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = body
+        return response
+
+    def test_unexpected_error_in_a_trial_call_settles_the_breaker(self):
+        with mock.patch.object(self.client.session, 'post', side_effect=requests.ConnectionError('down')):
+            with self.assertRaises(LLMError):
+                self.client.chat([], 'llama3')
+        self.assertTrue(self.breaker.is_open)
+        # The half-open trial dies of something other than a connection error
+        with mock.patch.object(self.client.session, 'post', side_effect=requests.exceptions.ChunkedEncodingError()):
+            with self.assertRaises(LLMError):
+                self.client.chat([], 'llama3')
+        self.assertFalse(self.breaker.trial_running)
+        with mock.patch.object(self.client.session, 'post', return_value=self.reply({'message': {'content': 'Hi'}})):
+            self.assertEqual(self.client.chat([], 'llama3'), 'Hi')
+        self.assertFalse(self.breaker.is_open)
+
+    def test_malformed_reply_is_an_llm_error(self):
+        with mock.patch.object(self.client.session, 'post', return_value=self.reply({'done': True})):
+            with self.assertRaises(LLMError):
+                self.client.chat([], 'llama3')
+
+    def test_async_client_is_closed_with_its_loop(self):
+        async def view():
+            return llm.get_async_client()
+
+        # What WSGI does for every async view
+        client = async_to_sync(view)()
+        self.assertTrue(client.http.is_closed)
+
+
+@override_settings(
+    CHATBOT_MODEL='llama3', RESUME_MODEL='llama3', PDF_SUMMARY_MODEL='llama3:8b', DOCUMENT_QA_MODEL='llama3',
+    DOCUMENT_QA_EMBED_MODEL='nomic-embed-text',
+)
+class ReadinessTests(SimpleTestCase):
+    def check(self, **patch):
+        with mock.patch.object(LLMClient, 'running_models', **patch):
+            return self.client.get(reverse('readiness_check'))
+
+    def test_ready_once_every_model_is_resident(self):
+        response = self.check(return_value={'llama3:latest', 'llama3:8b', 'nomic-embed-text:latest'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'ready': True, 'models': {'llama3': True, 'llama3:8b': True, 'nomic-embed-text': True},
+        })
+
+    def test_not_ready_while_a_model_is_missing(self):
+        response = self.check(return_value={'llama3:latest', 'nomic-embed-text:latest'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['models']['llama3:8b'], False)
+
+    def test_not_ready_when_ollama_is_down(self):
+        with self.assertLogs('core.warmup', 'WARNING'):
+            response = self.check(side_effect=LLMError('down'))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(any(response.json()['models'].values()))
+
+
+class OCRBackendTests(SimpleTestCase):
+    def setUp(self):
+        ocr.backend.cache_clear()
+        self.addCleanup(ocr.backend.cache_clear)
+
+    @override_settings(PDF_OCR_BACKEND='auto')
+    def test_auto_prefers_the_batched_command(self):
+        with mock.patch.object(ocr, 'tesseract_cmd', return_value='/usr/bin/tesseract'), \
+                mock.patch.object(ocr, 'tessdata_dir', return_value='/usr/share/tessdata'):
+            self.assertEqual(ocr.backend(), 'tesseract')
+        ocr.backend.cache_clear()
+        with mock.patch.object(ocr, 'tesseract_cmd', return_value=None), \
+                mock.patch.object(ocr, 'tessdata_dir', return_value='/usr/share/tessdata'):
+            self.assertEqual(ocr.backend(), 'mupdf')
+
+
+class SQLiteWriteTests(SimpleTestCase):
+    """Two writers on a scratch copy of the configured SQLite database."""
+    alias = 'concurrent_writes'
+
+    def setUp(self):
+        default = connections.databases['default']
+        if default['ENGINE'] != 'django.db.backends.sqlite3':
+            self.skipTest('SQLite only')
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        connections.databases[self.alias] = dict(default, NAME=os.path.join(workdir.name, 'db.sqlite3'))
+        self.addCleanup(connections.databases.pop, self.alias)
+        # Added after the class was set up, so allow it here
+        patcher = mock.patch.object(type(self), 'databases', {self.alias})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER)')
+            cursor.execute('INSERT INTO counter VALUES (1, 0)')
+        connections[self.alias].close()
+
+    def test_read_then_write_transactions_wait_for_each_other(self):
+        # A deferred transaction that reads first can't wait for the write
+        # lock and fails with "database is locked"; IMMEDIATE takes it up front.
+        writes = 20
+        start = threading.Barrier(2)
+        errors = []
+
+        def writer():
+            try:
+                start.wait()
+                for _ in range(writes):
+                    with transaction.atomic(using=self.alias), connections[self.alias].cursor() as cursor:
+                        cursor.execute('SELECT value FROM counter WHERE id = 1')
+                        value = cursor.fetchone()[0]
+                        time.sleep(0.005)
+                        cursor.execute('UPDATE counter SET value = %s WHERE id = 1', [value + 1])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections[self.alias].close()
+
+        threads = [threading.Thread(target=writer) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('SELECT value FROM counter WHERE id = 1')
+            self.assertEqual(cursor.fetchone()[0], 2 * writes)
+        connections[self.alias].close()
+
+
+class ResumePrerenderTests(SimpleTestCase):
+    def test_saves_waiting_in_the_queue_coalesce(self):
+        with mock.patch.object(resume._prerender_pool, 'submit') as submit:
+            resume.queue_prerender(7)
+            resume.queue_prerender(7)
+            self.assertEqual(submit.call_count, 1)
+            # Once its render starts, the next save queues another
+            resume._prerender_pending.discard(7)
+            resume.queue_prerender(7)
+            self.assertEqual(submit.call_count, 2)
+        resume._prerender_pending.discard(7)
+
+
+class ResumeRenderingTests(SimpleTestCase):
+    data = {
+        'full_name': 'Alice &amp; Co', 'email': 'alice@example.com', 'phone': '1', 'location': 'Here',
+        'summary': 'I write &lt;code&gt;.',
+        'education': [{'degree': 'BSc', 'institution': 'Uni', 'start_date': '2010', 'end_date': '2013'}],
+        'experience': [
+            {
+                'title': 'Developer', 'company': 'Acme', 'start_date': '2013', 'end_date': 'Present',
+                'description': 'Built it',
+            },
+            {'title': 'Intern', 'company': 'Beta', 'start_date': '2012', 'end_date': '2013', 'description': ''},
+        ],
+        'skills': [{'category': 'Languages', 'skills': ['Python', 'SQL']}],
+    }
+
+    def test_markup_comes_from_the_template(self):
+        html = resume.render_resume(self.data)
+        self.assertTrue(html.startswith('<h1>Alice &amp; Co</h1>'))
+        self.assertIn('<p>I write &lt;code&gt;.</p>', html)
+        self.assertIn('<div class="entry-subtitle">Acme</div>', html)
+        self.assertIn('<div class="entry-date">2010 - 2013</div>', html)
+        self.assertIn('<li>Python</li><li>SQL</li>', html)
+
+    def test_only_the_prose_is_polished(self):
+        chat = mock.AsyncMock(side_effect=['Here is the rewritten summary:\nI write <b>code</b>.', '"Shipped it"'])
+        with mock.patch.object(AsyncLLMClient, 'chat', chat):
+            polished = async_to_sync(resume.polish_resume)(self.data)
+        # The summary and the one non-empty description
+        self.assertEqual(chat.call_count, 2)
+        self.assertIn('I write <code>.', chat.call_args_list[0].args[0][0]['content'])
+        self.assertEqual(polished['summary'], 'I write &lt;b&gt;code&lt;/b&gt;.')
+        self.assertEqual([exp['description'] for exp in polished['experience']], ['Shipped it', ''])
+        self.assertEqual(polished['education'], self.data['education'])
+
+    def test_failed_rewrite_keeps_the_original(self):
+        with mock.patch.object(AsyncLLMClient, 'chat', mock.AsyncMock(side_effect=LLMError('down'))):
+            with self.assertLogs('core.resume', 'WARNING'):
+                polished = async_to_sync(resume.polish_resume)(self.data)
+        self.assertEqual(polished, self.data)
+
+
+class UserProfileSignalTests(TestCase):
+    def test_new_user_gets_a_profile(self):
+        user = User.objects.create_user('bob', password='secret-pass')
+        self.assertTrue(UserProfile.objects.filter(user=user).exists())
+
+    def test_saving_a_user_does_not_touch_the_profile(self):
+        user = User.objects.create_user('bob', password='secret-pass')
+        user.first_name = 'Bob'
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_for_user_creates_a_missing_profile(self):
+        user = User.objects.create_user('bob', password='secret-pass')
+        UserProfile.objects.filter(user=user).delete()
+        user = User.objects.get(pk=user.pk)
+        profile = UserProfile.for_user(user)
+        self.assertEqual(profile.user_id, user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(user.userprofile, profile)
+
+
+class ExtractedDocumentTests(TestCase):
+    def test_pages_round_trip(self):
+        sections = [Section(1, 'Digital page\n', 'text'), Section(2, 'Scanned page ' * 200, 'ocr')]
+        document = ExtractedDocument.store('c' * 64, sections)
+        self.assertEqual((document.page_count, document.ocr_page_count), (2, 1))
+        self.assertEqual(list(document.sections()), sections)
+        self.assertEqual(list(document.sections(start=2)), sections[1:])
+        self.assertLess(len(document.pages.get(number=2).compressed_text), 100)
+
+    def test_worker_reuses_stored_text(self):
+        # The same file, uploaded again after the summary prompt changed
+        data = b'%PDF-1.4 not really a PDF'
+        document = ExtractedDocument.store(pdf_processing.file_hash([data]), [Section(1, 'Stored text\n', 'ocr')])
+        user = User.objects.create_user('bob', password='secret-pass')
+        PDFSummaryJob.objects.create(user=user, file_name='scan.pdf', data=data)
+        job = PDFSummaryJob.claim_next('test')
+        with mock.patch.object(extractors.PDFExtractor, 'sections', side_effect=AssertionError('re-extracted')), \
+                mock.patch.object(pdf_processing, 'summarize', return_value=('Title', '<p>Summary</p>')) as summarize:
+            pdf_processing.process_job(job)
+        self.assertEqual(job.status, PDFSummaryJob.STATUS_DONE, job.error)
+        self.assertEqual(summarize.call_args.args[0], 'Stored text\n')
+        self.assertEqual(job.result.document, document)
+        # Indexed for questions by the worker later, not inside the job
+        self.assertEqual(DocumentIndexJob.objects.get().key, document.file_hash)
+
+    def test_worker_resolves_the_extractor_like_the_upload(self):
+        # A name without an extension falls back to the MIME type, in the view and in the worker
+        pdf = fitz.open()
+        pdf.new_page().insert_text((72, 72), 'Quarterly figures')
+        user = User.objects.create_user('bob', password='secret-pass')
+        job = PDFSummaryJob.objects.create(
+            user=user, file_name='scan', content_type='application/pdf', data=pdf.tobytes()
+        )
+        document = pdf_processing.extract_document(job)
+        self.assertIn('Quarterly figures', next(document.sections()).text)
+
+
+def _ocr_range_last_batch_first(source, numbers):
+    # Stand-in for extractors._ocr_range in the pool processes: later
+    # batches finish first, so results arrive out of page order
+    time.sleep(max(0.0, 0.3 - numbers[0] * 0.03))
+    return [Section(number + 1, f'OCR of page {number + 1}\n', 'ocr') for number in numbers]
+
+
+class PDFExtractorTests(SimpleTestCase):
+    @override_settings(PDF_EXTRACTION_MIN_PAGES_PER_WORKER=1)
+    def test_ocr_pages_come_back_in_page_order_from_the_pool(self):
+        if multiprocessing.get_start_method() != 'fork':
+            self.skipTest('the stand-in OCR reaches the pool processes by forking')
+        pdf = fitz.open()
+        for number in range(1, 11):
+            page = pdf.new_page()
+            if number % 3 == 0:
+                page.insert_text((72, 72), f'Digital page {number} ' * 10)
+        with mock.patch.object(ocr, 'backend', return_value='tesseract'), \
+                mock.patch.object(extractors, '_ocr_range', _ocr_range_last_batch_first):
+            sections = list(extractors.for_file('scan.pdf').sections(pdf.tobytes(), workers=3))
+        self.assertEqual([section.number for section in sections], list(range(1, 11)))
+        self.assertEqual(
+            [section.method for section in sections],
+            ['text' if number % 3 == 0 else 'ocr' for number in range(1, 11)]
+        )
+        self.assertEqual(sections[0].text, 'OCR of page 1\n')
+
+
+class OfficeExtractorTests(SimpleTestCase):
+    def save(self, document):
+        out = io.BytesIO()
+        document.save(out)
+        return out.getvalue()
+
+    def test_docx_blocks_in_document_order(self):
+        document = docx.Document()
+        document.add_paragraph('Introduction')
+        table = document.add_table(rows=1, cols=2)
+        table.cell(0, 0).text, table.cell(0, 1).text = 'Budget', '$5,000'
+        document.add_paragraph('Conclusion')
+        extractor = extractors.for_file('report.docx')
+        with mock.patch.object(extractor, 'SECTION_CHARS', 15):
+            sections = list(extractor.sections(self.save(document)))
+        self.assertEqual(sections, [
+            Section(1, 'Introduction\nBudget | $5,000\n', 'text'),
+            Section(2, 'Conclusion\n', 'text'),
+        ])
+
+    def test_pptx_one_section_per_slide_with_notes(self):
+        presentation = pptx.Presentation()
+        layout = presentation.slide_layouts[5]  # title only
+        first = presentation.slides.add_slide(layout)
+        first.shapes.title.text = 'Quarterly results'
+        first.notes_slide.notes_text_frame.text = 'Mention the travel budget'
+        presentation.slides.add_slide(presentation.slide_layouts[6])  # blank
+        sections = list(extractors.for_file('deck.pptx').sections(self.save(presentation)))
+        self.assertEqual(sections, [
+            Section(1, 'Quarterly results\nNotes: Mention the travel budget\n', 'text'),
+            Section(2, '', 'text'),
+        ])
+
+
+@override_settings(PDF_JOB_TIMEOUT=60, PDF_JOB_MAX_ATTEMPTS=2)
+class PDFJobQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret-pass')
+
+    def queue(self, name='a.pdf'):
+        return PDFSummaryJob.objects.create(user=self.user, file_name=name, content_hash=name * 8, data=b'%PDF')
+
+    def go_quiet(self, job, seconds=120):
+        # As if the worker had not been heard from for ``seconds``
+        PDFSummaryJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_claim_next_takes_each_job_once_oldest_first(self):
+        first, second = self.queue('a.pdf'), self.queue('b.pdf')
+        claimed = PDFSummaryJob.claim_next('worker-1')
+        self.assertEqual((claimed.pk, claimed.status, claimed.worker, claimed.attempts),
+                         (first.pk, PDFSummaryJob.STATUS_RUNNING, 'worker-1', 1))
+        self.assertEqual(PDFSummaryJob.claim_next('worker-2').pk, second.pk)
+        self.assertIsNone(PDFSummaryJob.claim_next('worker-3'))
+
+    def test_requeue_stale(self):
+        self.queue('a.pdf')
+        job = PDFSummaryJob.claim_next('worker-1')
+        self.go_quiet(job)
+        self.assertEqual(PDFSummaryJob.requeue_stale(), 1)
+        self.assertEqual(PDFSummaryJob.objects.get(pk=job.pk).status, PDFSummaryJob.STATUS_QUEUED)
+
+        # Out of attempts: failed rather than queued again
+        job = PDFSummaryJob.claim_next('worker-1')
+        self.go_quiet(job)
+        self.assertEqual(PDFSummaryJob.requeue_stale(), 0)
+        self.assertEqual(PDFSummaryJob.objects.get(pk=job.pk).status, PDFSummaryJob.STATUS_FAILED)
+
+    def test_progress_keeps_a_long_job_alive(self):
+        self.queue('a.pdf')
+        job = PDFSummaryJob.claim_next('worker-1')
+        PDFSummaryJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=2))
+        job.heartbeat_at -= timedelta(seconds=120)
+        job.save_progress('# Report')
+        self.assertEqual(PDFSummaryJob.requeue_stale(), 0)
+
+    def test_only_the_current_run_finishes_a_job(self):
+        SummaryCacheEntry.objects.create(
+            content_hash='a.pdf' * 8, pipeline_version='test', title='Report', summary='<p>Text</p>'
+        )
+        self.queue('a.pdf')
+        slow = PDFSummaryJob.claim_next('worker-1')
+        self.go_quiet(slow)
+        PDFSummaryJob.requeue_stale()
+        current = PDFSummaryJob.claim_next('worker-2')
+
+        pdf_processing.process_job(slow)
+        self.assertFalse(PDFSummary.objects.exists())
+        pdf_processing.process_job(current)
+        job = PDFSummaryJob.objects.get(pk=current.pk)
+        self.assertEqual(job.status, PDFSummaryJob.STATUS_DONE)
+        self.assertEqual(list(PDFSummary.objects.all()), [job.result])
+
+
+@override_settings(FILE_UPLOAD_MAX_SIZE=1024)
+class UploadSizeLimitTests(SimpleTestCase):
+    def setUp(self):
+        self.get_response = mock.Mock(return_value=HttpResponse('ok'))
+        self.middleware = UploadSizeLimitMiddleware(self.get_response)
+
+    def test_oversized_content_length_is_rejected_unread(self):
+        request = RequestFactory().post('/pdf-summary/', b'x', content_type='application/pdf', CONTENT_LENGTH='1025')
+        response = self.middleware(request)
+        self.assertEqual(response.status_code, 413)
+        self.assertContains(response, '1.0\xa0KB', status_code=413)
+        self.get_response.assert_not_called()
+
+    def test_request_under_the_limit_passes(self):
+        request = RequestFactory().post('/pdf-summary/', b'x' * 1024, content_type='application/pdf')
+        self.assertEqual(self.middleware(request).status_code, 200)
+        self.get_response.assert_called_once_with(request)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class LoginQueryTests(TestCase):
+    def setUp(self):
+        User.objects.create_user('alice', password='secret-pass', first_name='Alice')
+
+    def test_login(self):
+        # user; new session key (exists check, insert); last_login; session
+        # data at the end of the request. The two session writes each run in
+        # a savepoint here, as the test itself is a transaction.
+        with self.assertNumQueries(9):
+            response = self.client.post(reverse('login'), {'username': 'alice', 'password': 'secret-pass'})
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+
+
+class PageQueryTests(QueryBudgetTestCase):
+    def test_home(self):
+        # user
+        with self.assertNumQueries(1):
+            self.client.get(reverse('home'))
+
+    def test_profile(self):
+        # user, profile (read once for the forms and the template)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_pdf_summary(self):
+        # user (shared by the async view and the template)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('pdf_summary'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_resume_builder_auto_fill(self):
+        # user, profile
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('resume_builder'), {'type': 'auto'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_resumes_list(self):
+        for n in range(3):
+            Resume.objects.create(
+                user=self.user, full_name=f'Alice {n}', email='alice@example.com', phone='1', location='Here',
+                summary='Summary', education=[], experience=[], skills=[]
+            )
+        # user, one page of resumes
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('resumes_view_all'))
+        self.assertContains(response, 'Alice 2')
+
+    def test_pdf_summaries_list(self):
+        for n in range(3):
+            PDFSummary.objects.create(user=self.user, file_name=f'{n}.pdf', title=f'Report {n}', summary='<p>Text</p>')
+        # user, one page of summaries
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('pdf_summaries_view_all'))
+        self.assertContains(response, 'Report 2')
+
+    def test_pdf_summaries_search(self):
+        PDFSummary.objects.create(user=self.user, file_name='a.pdf', title='Budget report', summary='<p>Text</p>')
+        # user, full-text match, matching rows
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('pdf_summaries_view_all'), {'q': 'budget'})
+        self.assertContains(response, 'Budget report')
+
+
+@override_settings(PDF_JOB_EVENTS_WSGI_SECONDS=0, PDF_JOB_PROGRESS_INTERVAL=0)
+class PDFJobEventsTests(QueryBudgetTestCase):
+    def test_wsgi_stream_ends_for_the_browser_to_reconnect(self):
+        job = PDFSummaryJob.objects.create(
+            user=self.user, file_name='a.pdf', status=PDFSummaryJob.STATUS_RUNNING, partial_summary='# Title\n'
+        )
+        response = self.client.get(reverse('pdf_summary_job_events', args=[job.id]))
+        events = b''.join(response.streaming_content).decode()
+        self.assertTrue(events.startswith('retry: '))
+        self.assertIn('event: delta', events)
+        self.assertNotIn('event: done', events)
+
+
+@override_settings(RESUME_PDF_PRERENDER=False)
+class ResumeDownloadTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        overrides = override_settings(RESUME_PDF_CACHE_DIR=cache_dir.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.resume = Resume.objects.create(
+            user=self.user, full_name='Alice', email='alice@example.com', phone='1', location='Here',
+            summary='Summary', education=[], experience=[], skills=[], generated_content='<h1>Alice</h1>'
+        )
+        self.url = reverse('download_resume_pdf', args=[self.resume.id])
+
+    def test_repeat_download_is_a_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with mock.patch.object(resume, 'render_resume_pdf') as render:
+            # user; resume version
+            with self.assertNumQueries(2):
+                response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+            # Without a validator the cached bytes are served, not rendered again
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        render.assert_not_called()
+
+    def test_edited_resume_gets_a_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.resume.summary = 'New summary'
+        self.resume.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_other_users_resume_is_a_404(self):
+        other = User.objects.create_user('bob', password='secret-pass')
+        self.resume.user = other
+        self.resume.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+@override_settings(LIBRARY_PAGE_SIZE=2)
+class LibraryPaginationTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.summaries = [
+            PDFSummary.objects.create(user=self.user, file_name=f'{n}.pdf', title=f'Report {n}', summary='<p>Text</p>')
+            for n in range(5)
+        ]
+
+    def page(self, **params):
+        return self.client.get(reverse('pdf_summaries_view_all'), params).context['pdf_summaries']
+
+    def titles(self, page):
+        return [summary.title for summary in page]
+
+    def test_walk_forward_and_back(self):
+        first = self.page()
+        self.assertEqual(self.titles(first), ['Report 4', 'Report 3'])
+        self.assertIsNone(first.previous_cursor)
+
+        second = self.page(after=first.next_cursor)
+        self.assertEqual(self.titles(second), ['Report 2', 'Report 1'])
+
+        last = self.page(after=second.next_cursor)
+        self.assertEqual(self.titles(last), ['Report 0'])
+        self.assertIsNone(last.next_cursor)
+
+        back = self.page(before=last.previous_cursor)
+        self.assertEqual(self.titles(back), ['Report 2', 'Report 1'])
+        self.assertEqual(back.next_cursor, second.next_cursor)
+        front = self.page(before=back.previous_cursor)
+        self.assertEqual(self.titles(front), ['Report 4', 'Report 3'])
+        self.assertIsNone(front.previous_cursor)
+
+    def test_rows_with_the_same_timestamp_are_not_skipped(self):
+        PDFSummary.objects.update(created_at=self.summaries[0].created_at)
+        seen, cursor = [], None
+        while True:
+            page = self.page(after=cursor) if cursor else self.page()
+            seen += self.titles(page)
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        self.assertEqual(sorted(seen), [f'Report {n}' for n in range(5)])
+
+    def test_malformed_cursor_means_the_first_page(self):
+        for cursor in ['not-a-cursor', '%%%', 'MjAyNnxhYmM']:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.titles(self.page(after=cursor)), ['Report 4', 'Report 3'])
+                self.assertEqual(self.titles(self.page(before=cursor)), ['Report 4', 'Report 3'])
+
+    def test_resumes_are_paginated_the_same_way(self):
+        for n in range(3):
+            Resume.objects.create(
+                user=self.user, full_name=f'Alice {n}', email='alice@example.com', phone='1', location='Here',
+                summary='Summary', education=[], experience=[], skills=[]
+            )
+        first = self.client.get(reverse('resumes_view_all')).context['resumes']
+        self.assertEqual([resume.full_name for resume in first], ['Alice 2', 'Alice 1'])
+        rest = self.client.get(reverse('resumes_view_all'), {'after': first.next_cursor}).context['resumes']
+        self.assertEqual([resume.full_name for resume in rest], ['Alice 0'])
+
+
+class SummarySearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='secret-pass')
+        self.summary = PDFSummary.objects.create(
+            user=self.user, file_name='a.pdf', title='Budget report', summary='<p>Text</p>'
+        )
+
+    def test_stale_index_row_is_skipped(self):
+        # Deleted without signals, so the full-text row stays behind
+        PDFSummary.objects.filter(pk=self.summary.pk)._raw_delete('default')
+        self.assertEqual(PDFSummary.search(self.user, 'budget'), [])
+
+    def test_without_fts5(self):
+        with mock.patch.object(search, 'fts5_available', return_value=False):
+            self.assertEqual(PDFSummary.search(self.user, 'budget'), [self.summary])
+
+
+TOPICS = ['budget', 'hiring', 'travel', 'security']
+
+
+def fake_embed(texts, *args, **kwargs):
+    # One dimension per topic word: a question lands next to the chunks on its topic
+    return [[text.lower().count(topic) + 0.01 for topic in TOPICS] for text in texts]
+
+
+class DocumentQATests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        index_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(index_dir.cleanup)
+        overrides = override_settings(DOCUMENT_INDEX_DIR=index_dir.name, DOCUMENT_QA_CHUNK_TOKENS=50, DOCUMENT_QA_TOP_K=2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.chat = mock.AsyncMock(return_value='The travel budget is $5,000 (page 3).')
+        patchers = [
+            mock.patch.object(LLMClient, 'embed', side_effect=fake_embed),
+            mock.patch.object(AsyncLLMClient, 'embed', mock.AsyncMock(side_effect=fake_embed)),
+            mock.patch.object(AsyncLLMClient, 'chat', self.chat),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def document(self, pages):
+        return [
+            Section(number, f'Page {number} is about {TOPICS[number % len(TOPICS)]}. ' * 8 + '\n', 'text')
+            for number in range(1, pages + 1)
+        ]
+
+    def ask(self, summary, question):
+        return self.client.post(
+            reverse('pdf_summary_ask', args=[summary.id]), json.dumps({'question': question}),
+            content_type='application/json'
+        )
+
+    def test_search_returns_closest_chunks(self):
+        index = qa.build_index('a' * 64, self.document(12))
+        hits = index.search(fake_embed(['hiring plans'])[0], 3)
+        self.assertEqual(len(hits), 3)
+        self.assertTrue(all('hiring' in hit.text for hit in hits))
+        self.assertEqual({hit.page % len(TOPICS) for hit in hits}, {1})
+
+    def test_prompt_size_does_not_grow_with_the_document(self):
+        # Two chunks of at most 50 tokens, whatever the length of the document
+        limit = len(qa.question_prompt('Report', 'What is the budget?', [])) + 2 * (
+            50 * settings.PDF_SUMMARY_CHARS_PER_TOKEN + len('[Page 400]\n\n')
+        )
+        for pages in (4, 400):
+            content_hash = f'{pages:064d}'
+            qa.build_index(content_hash, self.document(pages))
+            summary = PDFSummary.objects.create(
+                user=self.user, file_name='a.pdf', title='Report', summary='<p>Text</p>', content_hash=content_hash
+            )
+            # user, summary
+            with self.assertNumQueries(2):
+                response = self.ask(summary, 'What is the budget?')
+            data = response.json()
+            self.assertEqual(data['answer'], 'The travel budget is $5,000 (page 3).')
+            self.assertEqual(len(data['sources']), 2)
+            self.assertLessEqual(data['prompt_chars'], limit)
+
+    def test_index_is_built_from_the_summary_cache(self):
+        entry = SummaryCacheEntry.objects.create(
+            content_hash='b' * 64, pipeline_version='test', text='Security review notes. ' * 40, summary='<p>Text</p>'
+        )
+        summary = entry.create_summary(self.user, 'notes.pdf')
+        # Queued for the worker rather than embedded in the request
+        response = self.ask(summary, 'Any security issues?')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], str(qa.QAIndexing.retry_after))
+        self.ask(summary, 'Any security issues?')
+        self.assertEqual(DocumentIndexJob.objects.count(), 1)
+
+        self.assertTrue(qa.build_next_index())
+        self.assertFalse(qa.build_next_index())
+        response = self.ask(summary, 'Any security issues?')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['sources'][0]['page'], None)
+
+    def test_index_outlives_a_prompt_change(self):
+        document = ExtractedDocument.store('d' * 64, self.document(4))
+        qa.build_index(document.file_hash, self.document(4))
+        # Summarized again after the pipeline version changed: a new content hash, the same file
+        summary = PDFSummary.objects.create(
+            user=self.user, file_name='a.pdf', title='Report', summary='<p>Text</p>',
+            content_hash='e' * 64, document=document
+        )
+        response = self.ask(summary, 'What is the budget?')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(DocumentIndexJob.objects.exists())
+        self.assertEqual(qa.prune_indexes(), 0)
+
+    def test_invalid_question(self):
+        summary = PDFSummary.objects.create(user=self.user, file_name='a.pdf', title='Report', summary='<p>Text</p>')
+        url = reverse('pdf_summary_ask', args=[summary.id])
+        for body in ['["What?"]', '42', '{"question": 7}', '{"question": "  "}', 'not json']:
+            with self.subTest(body=body):
+                response = self.client.post(url, body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.chat.assert_not_called()
+
+    def test_summary_without_a_document(self):
+        summary = PDFSummary.objects.create(user=self.user, file_name='old.pdf', title='Old', summary='<p>Text</p>')
+        response = self.ask(summary, 'What is this about?')
+        self.assertEqual(response.status_code, 409)
+        self.chat.assert_not_called()
@@ -8,10 +8,15 @@ urlpatterns = [
     path('register/', views.register_view, name='register'),
     path('logout/', views.logout_view, name='logout'),
     path('pdf-summary/', views.pdf_summary, name='pdf_summary'),
+    path('pdf-summary/jobs/<int:job_id>/', views.pdf_summary_job_status, name='pdf_summary_job_status'),
+    path('pdf-summary/jobs/<int:job_id>/events/', views.pdf_summary_job_events, name='pdf_summary_job_events'),
     path('resume-builder/', views.resume_builder, name='resume_builder'),
     path('resume/<int:resume_id>/download/', views.download_resume_pdf, name='download_resume_pdf'),
     path('profile/', views.profile, name='profile'),
     path('resumes/', views.resumes_view_all, name='resumes_view_all'),
     path('pdf-summaries/', views.pdf_summaries_view_all, name='pdf_summaries_view_all'),
+    path('pdf-summaries/<int:summary_id>/', views.pdf_summary_body, name='pdf_summary_body'),
+    path('pdf-summaries/<int:summary_id>/ask/', views.pdf_summary_ask, name='pdf_summary_ask'),
+    path('readyz/', views.readiness_check, name='readiness_check'),
 ]
 
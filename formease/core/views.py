@@ -3,22 +3,32 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-import fitz  # PyMuPDF
-import ollama  # Using Ollama Python package
-from django.core.files.storage import FileSystemStorage
-import os
-import pytesseract
-import numpy as np
+import asyncio
 import json
-from .models import Resume, PDFSummary, UserProfile
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from . import extractors, qa
+from .llm import LLMError
+from .models import Resume, PDFSummary, PDFSummaryJob, SummaryCacheEntry, UserProfile
+from .pagination import keyset_page
+from .pdf_processing import SummaryFormatter, content_hash
+from .resume import PDFRenderError, get_resume_pdf, pdf_version, polish_resume, render_resume
+from .streaming import event_stream, sse
+from .warmup import readiness
+from django.http import Http404, HttpResponse, JsonResponse
+from django.template.defaultfilters import linebreaksbr
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.utils.html import escape
 from .forms import EditProfileForm, ExtendedUserCreationForm, UserProfileForm
 
-# Configure Tesseract path
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+async def arender(request, *args, **kwargs):
+    # Templates read the session and the user lazily, which is blocking ORM
+    # work; the user is the one the async view already loaded, not a second copy
+    request.user = await request.auser()
+    return await sync_to_async(render)(request, *args, **kwargs)
 
 def landing(request):
     if request.user.is_authenticated:
@@ -81,6 +91,11 @@ def logout_view(request):
     messages.success(request, 'Successfully logged out!')
     return redirect('landing')
 
+def readiness_check(request):
+    """200 once every configured model is loaded in Ollama, 503 until then."""
+    ready, models = readiness()
+    return JsonResponse({'ready': ready, 'models': models}, status=200 if ready else 503)
+
 @login_required
 def home(request):
     return render(request, 'core/home.html')
@@ -88,7 +103,7 @@ def home(request):
 @login_required
 def profile(request):
     # Get or create UserProfile for the current user
-    userprofile, created = UserProfile.objects.get_or_create(user=request.user)
+    userprofile = UserProfile.for_user(request.user)
     
     if request.method == 'POST':
         form_type = request.POST.get('form_type')
@@ -122,183 +137,210 @@ def profile(request):
         'profile_form': profile_form
     })
 
+def _queue_pdf_summary(request):
+    # Runs in a worker thread: parsing the upload, hashing it and the ORM
+    # calls are all blocking.
+    pdf_file = request.FILES.get('pdf_file')
+    if not pdf_file:
+        return None
+
+    # Validate file type
+    if extractors.for_file(pdf_file.name, pdf_file.content_type) is None:
+        messages.error(request, 'Please upload a PDF, Word (.docx) or PowerPoint (.pptx) file.')
+        return render(request, 'core/pdf_summary.html', {
+            'accept': ','.join(extractors.extensions()),
+            'max_upload_size': settings.FILE_UPLOAD_MAX_SIZE
+        })
+
+    # Someone already summarized this exact file: reuse their result
+    file_hash = content_hash(pdf_file.chunks())
+    entry = SummaryCacheEntry.lookup(file_hash)
+    if entry is not None:
+        pdf_summary = entry.create_summary(request.user, pdf_file.name)
+        messages.success(request, 'Summary generated successfully!')
+        return redirect(f"{reverse('pdf_summary')}?summary={pdf_summary.id}")
+
+    # Hand the work to the background worker so the request returns at once
+    job = PDFSummaryJob(
+        user=request.user,
+        file_name=pdf_file.name,
+        content_type=pdf_file.content_type or '',
+        content_hash=file_hash
+    )
+    job.attach(pdf_file)
+    job.save()
+    return redirect(f"{reverse('pdf_summary')}?job={job.id}")
+
 @login_required
-def pdf_summary(request):
+async def pdf_summary(request):
+    if request.method == 'POST':
+        response = await sync_to_async(_queue_pdf_summary)(request)
+        if response is not None:
+            return response
+
+    user = await request.auser()
+    job = None
     summary = None
-    if request.method == 'POST' and request.FILES.get('pdf_file'):
-        try:
-            pdf_file = request.FILES['pdf_file']
-            
-            # Validate file type
-            if not pdf_file.name.endswith('.pdf'):
-                messages.error(request, 'Please upload a valid PDF file.')
-                return render(request, 'core/pdf_summary.html')
-            
-            # Save uploaded file temporarily
-            fs = FileSystemStorage()
-            filename = fs.save(pdf_file.name, pdf_file)
-            file_path = fs.path(filename)
-
-            # Extract text from PDF
-            doc = fitz.open(file_path)
-            text = ""
-            
-            for page_num, page in enumerate(doc, 1):
-                try:
-                    # Try regular text extraction first
-                    regular_text = page.get_text()
-                    
-                    # If no text is found or text is very short, try OCR
-                    if not regular_text or len(regular_text.strip()) < 50:
-                        # Convert PDF page to image with higher DPI for better OCR
-                        zoom = 2  # zoom factor
-                        mat = fitz.Matrix(zoom, zoom)
-                        pix = page.get_pixmap(matrix=mat)
-                        
-                        # Get the image data as bytes
-                        img_bytes = pix.samples
-                        
-                        # Convert to numpy array and reshape
-                        img_array = np.frombuffer(img_bytes, dtype=np.uint8)
-                        img_array = img_array.reshape(pix.height, pix.width, pix.n)
-                        
-                        # Perform OCR directly on the image array
-                        ocr_text = pytesseract.image_to_string(img_array)
-                        text += ocr_text if ocr_text else ""
-                    else:
-                        text += regular_text
-                except Exception as e:
-                    messages.warning(request, f'Warning: Could not process page {page_num} properly. Using partial text.')
-                    text += regular_text
-                   
-            doc.close()
-            
-            # Clean up the temporary file
-            try:
-                os.remove(file_path)
-            except OSError:
-                pass
-
-            if not text.strip():
-                messages.error(request, 'Could not extract any text from the PDF. Please make sure the file contains readable text.')
-                return render(request, 'core/pdf_summary.html')
-
-            # Call Ollama for summarization with title extraction
-            try:
-                title_prompt = (
-                    "Do not add any prefixes or suffixes like '(Note: I've kept it concise while still capturing the main topic and purpose of the document)' or 'Here is a well-formatted summary of the text using HTML markup:' Based on the following text, generate a concise but descriptive title "
-                    "that summarizes the main topic or purpose of the document (maximum 5-7 words):\n\n"
-                    f"{text[:1000]}"  # Use first 1000 characters for title generation
-                )
-                
-                title_response = ollama.chat(
-                    model='llama3',
-                    messages=[{"role": "user", "content": title_prompt}]
-                )
-                generated_title = title_response['message']['content'].strip()
-                
-                # Clean up the title
-                if generated_title.startswith('"') and generated_title.endswith('"'):
-                    generated_title = generated_title[1:-1]
-                generated_title = generated_title.strip()
-
-                # Now generate the summary
-                summary_prompt = (
-                    "Create a well-formatted summary of the following text using HTML markup. Follow these rules:\n"
-                    "1. Use h2 tags for main sections\n"
-                    "2. Use h3 tags for subsections\n"
-                    "3. Use p tags for paragraphs\n"
-                    "4. Use ul/li tags for lists where appropriate\n"
-                    "5. Use div class='highlight' for important points\n"
-                    "6. Make it easy to read and understand\n"
-                    "7. Group related information under appropriate sections\n"
-                    "Text to summarize:\n\n"
-                    f"{text}"
-                )
-                
-                summary_response = ollama.chat(
-                    model='llama3',
-                    messages=[{"role": "user", "content": summary_prompt}]
-                )
-                summary = summary_response['message']['content'].strip()
-                
-                # Clean up the formatting if needed
-                if not summary.startswith('<'):
-                    formatted_lines = []
-                    for line in summary.split('\n'):
-                        line = line.strip()
-                        if line:
-                            if line.startswith('•') or line.startswith('-'):
-                                if not formatted_lines or not formatted_lines[-1].startswith('<ul>'):
-                                    formatted_lines.append('<ul>')
-                                formatted_lines.append(f'<li>{line.lstrip("•- ")}</li>')
-                            else:
-                                if formatted_lines and formatted_lines[-1].startswith('<ul>'):
-                                    formatted_lines.append('</ul>')
-                                formatted_lines.append(f'<p>{line}</p>')
-                    summary = '\n'.join(formatted_lines)
-                
-                # Save the summary to database with the generated title
-                PDFSummary.objects.create(
-                    user=request.user,
-                    file_name=pdf_file.name,
-                    title=generated_title,
-                    summary=summary
-                )
-                
-                messages.success(request, 'Summary generated successfully!')
-            except Exception as e:
-                messages.error(request, 'An error occurred while generating the summary. Please try again.')
-                return render(request, 'core/pdf_summary.html')
+    job_id = request.GET.get('job', '')
+    summary_id = request.GET.get('summary', '')
+    if job_id.isdigit():
+        job = await PDFSummaryJob.objects.select_related('result').defer('data').filter(id=job_id, user=user).afirst()
+        summary = job.result.summary if job and job.result else None
+    elif summary_id.isdigit():
+        pdf_summary = await PDFSummary.objects.filter(id=summary_id, user=user).afirst()
+        summary = pdf_summary.summary if pdf_summary else None
+
+    return await arender(request, 'core/pdf_summary.html', {
+        'job': job,
+        'summary': summary,
+        'accept': ','.join(extractors.extensions()),
+        'max_upload_size': settings.FILE_UPLOAD_MAX_SIZE
+    })
 
-        except Exception as e:
-            messages.error(request, f'An error occurred while processing your PDF: {str(e)}')
-            return render(request, 'core/pdf_summary.html')
+@login_required
+def pdf_summary_job_status(request, job_id):
+    job = get_object_or_404(PDFSummaryJob.objects.select_related('result').defer('data'), id=job_id, user=request.user)
+    data = {
+        'id': job.id,
+        'status': job.status,
+        'file_name': job.file_name,
+    }
+    if job.status == PDFSummaryJob.STATUS_DONE and job.result:
+        data['title'] = job.result.title
+        data['summary'] = linebreaksbr(job.result.summary, autoescape=False)
+    elif job.status == PDFSummaryJob.STATUS_FAILED:
+        data['error'] = job.error
+    return JsonResponse(data)
+
+class _PDFJobEvents:
+    # Turns successive snapshots of a job row into SSE messages: what the
+    # worker has streamed so far, formatted a line at a time, then the
+    # final summary or error.
+
+    def __init__(self):
+        self.formatter = SummaryFormatter()
+        self.sent = 0
+        self.deadline = time.monotonic() + settings.PDF_JOB_TIMEOUT
+        self.finished = False
+
+    def step(self, job):
+        if job.status == PDFSummaryJob.STATUS_DONE and job.result:
+            self.finished = True
+            return sse('done', {
+                'title': job.result.title,
+                'summary': linebreaksbr(job.result.summary, autoescape=False)
+            })
+        if job.status == PDFSummaryJob.STATUS_FAILED:
+            self.finished = True
+            return sse('error', {'error': job.error})
+        if time.monotonic() > self.deadline:
+            self.finished = True
+            return sse('error', {'error': 'Processing took too long. Please try again.'})
+
+        events = ''
+        partial = job.partial_summary
+        if len(partial) < self.sent:
+            # The job was retried and the stream started over
+            self.formatter = SummaryFormatter()
+            self.sent = 0
+            events += sse('reset', {})
+        html = self.formatter.feed(partial[self.sent:])
+        self.sent = len(partial)
+        return events + (sse('delta', {'html': html}) if html else ': keep-alive\n\n')
+
+def _pdf_job_events(job_id):
+    # Under WSGI the stream holds a server thread, so it ends after
+    # PDF_JOB_EVENTS_WSGI_SECONDS and EventSource reconnects after ``retry``
+    # milliseconds, rather than one page tying up a thread for the whole job.
+    relay = _PDFJobEvents()
+    interval = getattr(settings, 'PDF_JOB_PROGRESS_INTERVAL', 0.5)
+    end = time.monotonic() + settings.PDF_JOB_EVENTS_WSGI_SECONDS
+    yield 'retry: 1000\n\n'
+    while True:
+        yield relay.step(PDFSummaryJob.objects.select_related('result').defer('data').get(id=job_id))
+        if relay.finished or time.monotonic() > end:
+            return
+        time.sleep(interval)
+
+async def _apdf_job_events(job_id):
+    relay = _PDFJobEvents()
+    interval = getattr(settings, 'PDF_JOB_PROGRESS_INTERVAL', 0.5)
+    while True:
+        yield relay.step(await PDFSummaryJob.objects.select_related('result').defer('data').aget(id=job_id))
+        if relay.finished:
+            return
+        await asyncio.sleep(interval)
 
-    return render(request, 'core/pdf_summary.html', {'summary': summary})
+@login_required
+def pdf_summary_job_events(request, job_id):
+    job = get_object_or_404(PDFSummaryJob, id=job_id, user=request.user)
+    return event_stream(request, _pdf_job_events(job.id), _apdf_job_events(job.id))
+
+def _resume_version(request, resume_id):
+    # Looked up once for both the ETag and the Last-Modified check
+    if not hasattr(request, '_resume_version'):
+        request._resume_version = Resume.objects.filter(
+            id=resume_id, user=request.user
+        ).only('id', 'updated_at', 'full_name').first()
+    return request._resume_version
+
+def _resume_etag(request, resume_id):
+    resume = _resume_version(request, resume_id)
+    return pdf_version(resume) if resume else None
+
+def _resume_last_modified(request, resume_id):
+    resume = _resume_version(request, resume_id)
+    return resume.updated_at if resume else None
 
 @login_required
+@cache_control(private=True, no_cache=True)  # always revalidate; a match is a cheap 304
+@condition(etag_func=_resume_etag, last_modified_func=_resume_last_modified)
 def download_resume_pdf(request, resume_id):
-    resume = get_object_or_404(Resume, id=resume_id, user=request.user)
-    template = get_template('core/resume_pdf.html')
-    html = template.render({'resume_content': resume.generated_content})
-    
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{resume.full_name}_resume.pdf"'
+    resume = _resume_version(request, resume_id)
+    if resume is None:
+        raise Http404('No Resume matches the given query.')
     
-    # Convert HTML to PDF
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
+    # Rendered once per resume version and then served from disk; the
+    # deferred generated_content is only loaded when rendering
+    try:
+        pdf = get_resume_pdf(resume)
+    except PDFRenderError:
         return HttpResponse('Error generating PDF', status=500)
+
+    response = HttpResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{resume.full_name}_resume.pdf"'
     return response
 
+def _resume_auto_fill(user):
+    # Get user profile data
+    userprofile = UserProfile.for_user(user)
+    
+    # Format the skills from comma-separated string to list
+    skills_list = [s.strip() for s in userprofile.skills.split(',')] if userprofile.skills else []
+    
+    # Prepare auto-fill data
+    return {
+        'full_name': f"{user.first_name} {user.last_name}",
+        'email': user.email,
+        'phone': userprofile.phone_number,
+        'location': userprofile.address,
+        'summary': userprofile.bio or '',
+        'education': {
+            'degree': userprofile.highest_education,
+            'institution': userprofile.institution,
+            'graduation_year': userprofile.graduation_year
+        } if userprofile.highest_education else None,
+        'skills': [{'category': 'Skills', 'skills': skills_list}] if skills_list else []
+    }
+
 @login_required
-def resume_builder(request):
+async def resume_builder(request):
     form_type = request.GET.get('type')
     auto_fill = {}
+    user = await request.auser()
     
     if form_type == 'auto':
-        # Get user profile data
-        userprofile = request.user.userprofile
-        user = request.user
-        
-        # Format the skills from comma-separated string to list
-        skills_list = [s.strip() for s in userprofile.skills.split(',')] if userprofile.skills else []
-        
-        # Prepare auto-fill data
-        auto_fill = {
-            'full_name': f"{user.first_name} {user.last_name}",
-            'email': user.email,
-            'phone': userprofile.phone_number,
-            'location': userprofile.address,
-            'summary': userprofile.bio or '',
-            'education': {
-                'degree': userprofile.highest_education,
-                'institution': userprofile.institution,
-                'graduation_year': userprofile.graduation_year
-            } if userprofile.highest_education else None,
-            'skills': [{'category': 'Skills', 'skills': skills_list}] if skills_list else []
-        }
+        auto_fill = await sync_to_async(_resume_auto_fill)(user)
 
     if request.method == 'POST':
         try:
@@ -349,96 +391,12 @@ def resume_builder(request):
                 data['skills'].append(skills)
                 skills_count += 1
             
-            # Generate resume content using Ollama
-            prompt = """Create a professional resume using HTML markup with the following information. Do not write any prefix, do only what you are told, no prefix or suffix. i don't want anything like 'Here is the professional resume in HTML markup:' in the beginning. Follow the HTML structure exactly:
-
-<h1>{full_name}</h1>
-<div class="contact-info">
-<p>Email: <a href="mailto:{email}">{email}</a><br>
-Phone: {phone}<br>
-Location: {location}</p>
-</div>
-
-<div class="section">
-<h2 class="section-title">Professional Summary</h2>
-<p>{summary}</p>
-</div>
-
-<div class="section">
-<h2 class="section-title">Education</h2>
-""".format(**data)
-
-            # Add education entries
-            for edu in data['education']:
-                prompt += f"""
-<div class="entry">
-<div class="entry-title">{edu['degree']}</div>
-<div class="entry-subtitle">{edu['institution']}</div>
-<div class="entry-date">{edu['start_date']} - {edu['end_date']}</div>
-</div>"""
-
-            prompt += """
-</div>
-
-<div class="section">
-<h2 class="section-title">Experience</h2>
-"""
-
-            # Add experience entries
-            for exp in data['experience']:
-                prompt += f"""
-<div class="entry">
-<div class="entry-title">{exp['title']}</div>
-<div class="entry-subtitle">{exp['company']}</div>
-<div class="entry-date">{exp['start_date']} - {exp['end_date']}</div>
-<p>{exp['description']}</p>
-</div>"""
-
-            prompt += """
-</div>
-
-<div class="section">
-<h2 class="section-title">Skills</h2>
-"""
-
-            # Add skills entries
-            for skill in data['skills']:
-                prompt += f"""
-<div class="skills-category">
-<h3>{skill['category']}</h3>
-<ul class="skills-list">
-"""
-                for s in skill['skills']:
-                    prompt += f"<li>{s}</li>"
-                prompt += """
-</ul>
-</div>"""
-
-            prompt += """
-</div>"""
-
-            response = ollama.chat(
-                model='llama3',
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            generated_content = response['message']['content']
-            
-            # Clean up the generated HTML by removing any AI prefixes and code block markers
-            unwanted_prefixes = [
-                "Here is the HTML code for the professional resume:",
-                "```html",
-                "```",
-                "Here's the formatted resume:",
-                "Here's your professional resume:"
-            ]
-            for prefix in unwanted_prefixes:
-                generated_content = generated_content.replace(prefix, "")
-            generated_content = generated_content.strip()
+            # Only the prose goes to the model; the markup comes from a template
+            generated_content = render_resume(await polish_resume(data))
             
             # Save to database
             resume = Resume(
-                user=request.user,
+                user=user,
                 full_name=data['full_name'],
                 email=data['email'],
                 phone=data['phone'],
@@ -449,10 +407,10 @@ Location: {location}</p>
                 skills=data['skills'],
                 generated_content=generated_content
             )
-            resume.save()
+            await resume.asave()
             
             messages.success(request, 'Resume generated successfully!')
-            return render(request, 'core/resume_builder.html', {
+            return await arender(request, 'core/resume_builder.html', {
                 'resume_content': generated_content,
                 'resume_id': resume.id,
                 'form_type': form_type,
@@ -461,19 +419,24 @@ Location: {location}</p>
             
         except Exception as e:
             messages.error(request, f'An error occurred while generating your resume: {str(e)}')
-            return render(request, 'core/resume_builder.html', {
+            return await arender(request, 'core/resume_builder.html', {
                 'form_type': form_type,
                 'auto_fill': auto_fill
             })
     
-    return render(request, 'core/resume_builder.html', {
+    return await arender(request, 'core/resume_builder.html', {
         'form_type': form_type,
         'auto_fill': auto_fill
     })
 
 @login_required
 def resumes_view_all(request):
-    resumes = Resume.objects.filter(user=request.user).order_by('-created_at')
+    resumes = keyset_page(
+        Resume.objects.filter(user=request.user).only(*Resume.LIST_FIELDS),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=settings.LIBRARY_PAGE_SIZE
+    )
     return render(request, 'core/resumes_list.html', {'resumes': resumes})
 
 @login_required
@@ -482,8 +445,50 @@ def pdf_summaries_view_all(request):
     if query:
         pdf_summaries = PDFSummary.search(request.user, query)
     else:
-        pdf_summaries = PDFSummary.objects.filter(user=request.user).order_by('-created_at')
+        pdf_summaries = keyset_page(
+            PDFSummary.objects.filter(user=request.user).only(*PDFSummary.LIST_FIELDS),
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            per_page=settings.LIBRARY_PAGE_SIZE
+        )
     return render(request, 'core/pdf_summaries_list.html', {
         'pdf_summaries': pdf_summaries,
         'query': query
-    })
\ No newline at end of file
+    })
+
+@login_required
+def pdf_summary_body(request, summary_id):
+    """The summary HTML, loaded when a summary is opened on "My PDF Summaries"."""
+    summary = get_object_or_404(PDFSummary.objects.only('summary'), id=summary_id, user=request.user)
+    return HttpResponse(summary.summary)
+
+@login_required
+async def pdf_summary_ask(request, summary_id):
+    """Answer a question about a summarized document from its most relevant passages."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST requests are allowed'}, status=405)
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    question = data.get('question') if isinstance(data, dict) else None
+    if not isinstance(question, str) or not question.strip():
+        return JsonResponse({'error': 'Question is required'}, status=400)
+    question = question.strip()
+
+    user = await request.auser()
+    summary = await PDFSummary.objects.select_related('document').only(
+        'title', 'file_name', 'content_hash', 'document__file_hash'
+    ).filter(id=summary_id, user=user).afirst()
+    if summary is None:
+        raise Http404
+    try:
+        return JsonResponse(await qa.answer(summary, question))
+    except qa.QAIndexing as e:
+        response = JsonResponse({'error': str(e), 'retry_after': e.retry_after}, status=409)
+        response['Retry-After'] = e.retry_after
+        return response
+    except qa.QAError as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    except LLMError:
+        return JsonResponse({'error': 'The language model is not available right now. Please try again later.'}, status=503)
@@ -0,0 +1,83 @@
+"""Keep the configured Ollama models loaded.
+
+Ollama loads a model on its first request and unloads it ``keep_alive``
+after the last one, so the first chat after a deploy or a quiet spell
+waits for the model to come off disk. ``warm_up()`` loads every model the
+app uses up front, ``start_keep_alive()`` repeats that in the background
+before the models can expire, and ``readiness()`` reports whether they are
+all resident (served at ``/readyz/`` for the load balancer).
+"""
+import logging
+import threading
+
+from django.conf import settings
+
+from .llm import LLMError, get_client
+
+logger = logging.getLogger(__name__)
+
+_keep_alive_thread = None
+_keep_alive_lock = threading.Lock()
+
+
+def embedding_models():
+    return [settings.DOCUMENT_QA_EMBED_MODEL]
+
+
+def warm_models():
+    """Every model the app calls, without duplicates."""
+    return list(dict.fromkeys([
+        settings.CHATBOT_MODEL, settings.RESUME_MODEL, settings.PDF_SUMMARY_MODEL, settings.DOCUMENT_QA_MODEL,
+        *embedding_models(),
+    ]))
+
+
+def _full_name(model):
+    # Ollama reports models with their tag; an untagged name means ``latest``
+    return model if ':' in model else f'{model}:latest'
+
+
+def warm_up(models=None):
+    """Load ``models`` (default: all of them), returning ``{model: error}`` for failures."""
+    client = get_client()
+    errors = {}
+    for model in models or warm_models():
+        try:
+            client.load(model, settings.LLM_KEEP_ALIVE, embedding=model in embedding_models())
+        except LLMError as e:
+            logger.warning('Could not load model %s: %s', model, e)
+            errors[model] = str(e)
+        else:
+            logger.info('Model %s loaded (keep_alive=%s)', model, settings.LLM_KEEP_ALIVE)
+    return errors
+
+
+def readiness():
+    """``(ready, {model: resident})`` for every configured model."""
+    try:
+        running = {_full_name(name) for name in get_client().running_models()}
+    except LLMError as e:
+        logger.warning('Readiness check failed: %s', e)
+        running = set()
+    models = {model: _full_name(model) in running for model in warm_models()}
+    return all(models.values()), models
+
+
+def keep_alive_loop(stop, interval=None):
+    """Warm the models up every ``interval`` seconds until ``stop`` is set."""
+    interval = interval or settings.LLM_KEEP_ALIVE_INTERVAL
+    while not stop.is_set():
+        warm_up()
+        stop.wait(interval)
+
+
+def start_keep_alive():
+    """Run ``keep_alive_loop`` in a daemon thread, once per process."""
+    global _keep_alive_thread
+    with _keep_alive_lock:
+        if _keep_alive_thread is None:
+            _keep_alive_thread = threading.Thread(
+                target=keep_alive_loop, args=(threading.Event(),), name='llm-keep-alive', daemon=True
+            )
+            _keep_alive_thread.start()
+    return _keep_alive_thread
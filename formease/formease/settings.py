@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.UploadSizeLimitMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -76,14 +78,83 @@ WSGI_APPLICATION = "formease.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+#
+# SQLite by default, set up for web workers, the PDF worker and background threads writing
+# at the same time: WAL lets reads run alongside the one writer, write transactions take
+# the write lock when they begin (IMMEDIATE) so they queue on DB_TIMEOUT instead of failing
+# with "database is locked" when two of them read then write, and synchronous=NORMAL only
+# syncs at checkpoints, which WAL keeps safe. `manage.py bench_db_writes` shows the difference.
+# Set DB_ENGINE (e.g. django.db.backends.postgresql) and DB_NAME/USER/PASSWORD/HOST/PORT to
+# use a database server instead.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3')
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES = {
+        "default": {
+            "ENGINE": DB_ENGINE,
+            "NAME": os.environ.get('DB_NAME') or BASE_DIR / "db.sqlite3",
+            "OPTIONS": {
+                "timeout": int(os.environ.get('DB_TIMEOUT', 20)),  # seconds to wait for the write lock (busy_timeout)
+                "transaction_mode": "IMMEDIATE",
+                "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL",
+            },
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": DB_ENGINE,
+            "NAME": os.environ.get('DB_NAME', 'formease'),
+            "USER": os.environ.get('DB_USER', ''),
+            "PASSWORD": os.environ.get('DB_PASSWORD', ''),
+            "HOST": os.environ.get('DB_HOST', ''),
+            "PORT": os.environ.get('DB_PORT', ''),
+        }
+    }
 
-DATABASES = {
+# Under ASGI each request runs its ORM calls on a thread of its own, where persistent
+# connections pile up instead of being reused, so they are closed per request (0). Under WSGI, set
+# DB_CONN_MAX_AGE=60 to keep connections open between requests instead of reconnecting (and
+# re-running the pragmas above) every time; health checks replace connections the server dropped.
+DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get('DB_CONN_MAX_AGE', 0))
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+
+# Caches
+# The chatbot answer cache must be shared by every worker process, so it defaults to a
+# file-based cache; point CHATBOT_CACHE_BACKEND/LOCATION at Redis for multi-host setups
+# (e.g. django.core.cache.backends.redis.RedisCache, redis://127.0.0.1:6379/1).
+# Once MAX_ENTRIES is reached the file-based cache culls a random third of it, not the least
+# recently used entries.
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "chatbot": {
+        "BACKEND": os.environ.get('CHATBOT_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        "LOCATION": os.environ.get('CHATBOT_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'formease-chatbot-cache')),
+        "TIMEOUT": int(os.environ.get('CHATBOT_CACHE_TTL', 24 * 60 * 60)),  # seconds an unused answer is kept
+        "KEY_PREFIX": "chatbot",
+        "OPTIONS": {
+            "MAX_ENTRIES": 2000,
+        },
+    },
+    # Sessions, see SESSION_ENGINE; shared by every worker process for the same reason
+    "sessions": {
+        "BACKEND": os.environ.get('SESSION_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        "LOCATION": os.environ.get('SESSION_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'formease-sessions')),
+        "KEY_PREFIX": "sessions",
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
+    },
 }
 
+# Sessions are written through to the database but read from the cache, so a request
+# costs no session query while its session is cached
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -127,5 +198,117 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads
+# Requests larger than FILE_UPLOAD_MAX_SIZE are rejected with a 413 before the body is
+# read (core.middleware). Files up to FILE_UPLOAD_MAX_MEMORY_SIZE stay in memory and PDFs
+# that size are queued as bytes in the job row; bigger ones are spooled to
+# FILE_UPLOAD_TEMP_DIR and moved into MEDIA_ROOT, which is a rename when both are on
+# the same filesystem.
+FILE_UPLOAD_MAX_SIZE = int(os.environ.get('FILE_UPLOAD_MAX_SIZE', 20 * 1024 * 1024))
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # Django's default, 2.5 MB
+FILE_UPLOAD_TEMP_DIR = os.environ.get('FILE_UPLOAD_TEMP_DIR') or None
+PDF_UPLOAD_INLINE_MAX_SIZE = FILE_UPLOAD_MAX_MEMORY_SIZE
+
+# LLM backend (Ollama), shared by every feature through core.llm.get_client()
+LLM_BASE_URL = os.environ.get('OLLAMA_HOST', 'http://localhost:11434')
+LLM_MODEL = os.environ.get('LLM_MODEL', 'llama3')
+LLM_TIMEOUTS = {  # (connect, read) seconds per kind of call; read is the gap allowed between bytes
+    'default': (3, 120),
+    'chat': (3, 60),
+    'title': (3, 60),
+    'summary': (3, 300),
+    'resume': (3, 180),
+    'embed': (3, 120),
+    'answer': (3, 120),
+    'load': (3, 300),  # loading a model from disk can take a while
+    'health': (1, 2),
+}
+LLM_MAX_RETRIES = 2  # extra attempts after a connection error, timeout or 5xx
+LLM_RETRY_BACKOFF = 0.5  # seconds, doubled after every attempt
+LLM_POOL_SIZE = 10  # keep-alive connections per process
+LLM_CIRCUIT_FAILURE_THRESHOLD = 5  # consecutive failed calls before failing fast
+LLM_CIRCUIT_RESET_TIMEOUT = 30  # seconds before a trial call is let through again
+LLM_KEEP_ALIVE = os.environ.get('LLM_KEEP_ALIVE', '30m')  # how long Ollama keeps a model loaded after a call
+
+CHATBOT_MODEL = LLM_MODEL
+CHATBOT_CACHE_ENABLED = True  # answer repeated questions from the "chatbot" cache below
+CHATBOT_CONVERSATION_TIMEOUT = 30 * 60  # seconds of inactivity before a new conversation starts
+CHATBOT_CONTEXT_TTL = 30 * 60  # seconds Ollama's context for a conversation is kept
+CHATBOT_CONTEXT_MAX_TOKENS = 4096  # longer contexts are dropped in favour of recent history
+CHATBOT_HISTORY_MESSAGES = 6  # earlier exchanges replayed when no context is available
+CHATBOT_INTENTS_ENABLED = True  # answer navigation and small talk from chatbot/intents.py rules
+CHATBOT_INTENT_MAX_WORDS = 12  # longer messages always go to the model
+RESUME_MODEL = LLM_MODEL
+
+# Rendered resume PDFs, one file per resume version; safe to delete at any time
+RESUME_PDF_CACHE_DIR = os.environ.get('RESUME_PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'formease-resume-pdfs'))
+RESUME_PDF_PRERENDER = True  # render the PDF in the background as soon as a resume is saved
+RESUME_PDF_PRERENDER_WORKERS = 2  # threads shared by those renders, per process
+
+# PDF summarization model. Bump the prompt version whenever the prompts change so
+# cached summaries produced by the old prompts stop matching.
+PDF_SUMMARY_MODEL = LLM_MODEL
+PDF_SUMMARY_PROMPT_VERSION = '2'
+
+# Model warm-up (core.warmup): load every model above before users need it and
+# ping them often enough that they never reach LLM_KEEP_ALIVE and get unloaded.
+# Enable LLM_WARM_UP_ON_STARTUP in web processes, or run `manage.py warm_models --loop`.
+LLM_WARM_UP_ON_STARTUP = os.environ.get('LLM_WARM_UP_ON_STARTUP', '') == '1'
+LLM_KEEP_ALIVE_INTERVAL = 10 * 60  # seconds between keep-alive pings; keep below LLM_KEEP_ALIVE
+
+# Documents longer than PDF_SUMMARY_CHUNK_TOKENS are summarized map-reduce style:
+# token-budgeted chunks summarized PDF_SUMMARY_CONCURRENCY at a time, then combined.
+PDF_SUMMARY_CHUNK_TOKENS = 6000
+PDF_SUMMARY_CONCURRENCY = 4
+PDF_SUMMARY_CHARS_PER_TOKEN = 4  # rough estimate used to size chunks without a tokenizer
+# Ollama silently truncates prompts to its default context (2048-4096 tokens), so every
+# summary call asks for a context that holds a full chunk, the instructions and the reply.
+# One fixed size for every call, as a different num_ctx makes Ollama reload the model (so a
+# chatbot sharing PDF_SUMMARY_MODEL is best served by OLLAMA_CONTEXT_LENGTH set to match).
+PDF_SUMMARY_PROMPT_TOKENS = 512  # instructions around the chunk
+PDF_SUMMARY_OUTPUT_TOKENS = 2048  # room for the reply
+PDF_SUMMARY_NUM_CTX = PDF_SUMMARY_CHUNK_TOKENS + PDF_SUMMARY_PROMPT_TOKENS + PDF_SUMMARY_OUTPUT_TOKENS
+
+# Document Q&A (core/qa.py): extracted text is split into chunks of about
+# DOCUMENT_QA_CHUNK_TOKENS, embedded with DOCUMENT_QA_EMBED_MODEL and stored as one
+# memory-mapped float32 matrix per document; a question sends only the
+# DOCUMENT_QA_TOP_K closest chunks to DOCUMENT_QA_MODEL.
+DOCUMENT_QA_MODEL = LLM_MODEL
+DOCUMENT_QA_EMBED_MODEL = os.environ.get('EMBED_MODEL', 'nomic-embed-text')
+DOCUMENT_QA_CHUNK_TOKENS = 300
+DOCUMENT_QA_TOP_K = 4
+DOCUMENT_QA_EMBED_BATCH = 32  # chunks per /api/embed call while indexing
+DOCUMENT_INDEX_DIR = os.environ.get('DOCUMENT_INDEX_DIR', os.path.join(BASE_DIR, 'document_index'))
+
+PDF_SUMMARY_SEARCH_LIMIT = 100  # most search results shown on "My PDF Summaries"
+LIBRARY_PAGE_SIZE = 20  # resumes or summaries per page on "My Resumes" / "My PDF Summaries"
+
+# Content-addressed summary cache, trimmed by `manage.py prune_summary_cache`
+PDF_SUMMARY_CACHE_MAX_AGE_DAYS = 90
+PDF_SUMMARY_CACHE_MAX_ENTRIES = 10000
+
+# PDF summary background jobs (processed by `manage.py run_pdf_worker`)
+PDF_JOB_POLL_INTERVAL = 2  # seconds an idle worker waits before checking the queue again
+PDF_JOB_TIMEOUT = 30 * 60  # running jobs without a heartbeat for this long are assumed dead and requeued
+PDF_JOB_HEARTBEAT_INTERVAL = 30  # how often a running job marks itself alive
+PDF_JOB_MAX_ATTEMPTS = 3
+PDF_JOB_PROGRESS_INTERVAL = 0.5  # how often streamed summary text is saved and relayed over SSE
+PDF_JOB_EVENTS_WSGI_SECONDS = 30  # under WSGI an SSE stream ends after this and the browser reconnects
+
+# Page extraction/OCR fans out over a process pool; None means one process per CPU core
+PDF_EXTRACTION_WORKERS = int(os.environ.get('PDF_EXTRACTION_WORKERS', 0)) or None
+PDF_EXTRACTION_MIN_PAGES_PER_WORKER = 2
+
+# OCR for pages without a usable text layer (core/ocr.py). "auto" prefers the tesseract command,
+# run once per batch of pages, over MuPDF's built-in Tesseract, which sets up an engine per page.
+PDF_OCR_BACKEND = os.environ.get('PDF_OCR_BACKEND', 'auto')  # auto, mupdf or tesseract
+PDF_OCR_LANGUAGE = os.environ.get('PDF_OCR_LANGUAGE', 'eng')  # e.g. "eng+deu"
+PDF_OCR_TESSDATA = os.environ.get('TESSDATA_PREFIX') or None  # found automatically when unset
+TESSERACT_CMD = os.environ.get('TESSERACT_CMD') or None  # found on PATH when unset
+PDF_OCR_MIN_TEXT_CHARS = 50  # pages with less text than this are OCRed
+PDF_OCR_MIN_DPI = 150
+PDF_OCR_MAX_DPI = 300
+PDF_OCR_MAX_PIXELS = 12_000_000  # caps the render size of oversized pages
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"